@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Benchmark parsowania terminarzy Transfermarkt (spielplan): backend bs4 vs lxml.
+
+Mierzy czas parsowania jednej strony (ms/stronę) dla każdego backendu i sprawdza,
+że oba zwracają identyczne mecze. Strony:
+- z archiwum surowych stron (--archive <output>.archive) — wszystkie URL-e /spielplan/,
+- albo z plików HTML podanych jako argumenty,
+- albo (domyślnie) syntetyczna strona o rozmiarze zbliżonym do sezonu TM.
+
+Przykład:
+  python benchmark_tm_parsing.py --archive out.archive > bench_output.txt   # dla -o out.csv
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import sys
+import time
+from datetime import date
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from goalkeeper_complete_system_MATCHCENTRIC_COM import PARSER_BACKENDS, PageArchive, html_payload, parse_fixtures
+
+BASE = "https://www.transfermarkt.com"
+
+def synthetic_spielplan(matches: int = 60, noise_blocks: int = 400) -> str:
+    """Strona podobna do spielplan: duży 'szum' nawigacji + kilka tabel .items z meczami."""
+    noise = "".join(
+        f'<div class="box"><ul class="nav"><li><a href="/nav/{i}">Link {i}</a></li>'
+        f'<li><img src="/i/{i}.png" alt="x"></li><li><span>Tekst {i}</span></li></ul></div>'
+        for i in range(noise_blocks)
+    )
+    rows = []
+    for i in range(matches):
+        d = date(2025, 7, 1).toordinal() + i * 5
+        dd = date.fromordinal(d)
+        ha = "H" if i % 2 else "A"
+        rows.append(
+            f'<tr><td class="zentriert">{i + 1}</td><td class="zentriert">{dd.strftime("%d.%m.%Y")}</td>'
+            f'<td class="zentriert">18:00</td><td class="zentriert">{ha}</td>'
+            f'<td class="no-border-links"><a href="/club/startseite/verein/10">Club 10</a></td>'
+            f'<td class="no-border-links"><a href="/opp/startseite/verein/{900 + i}">Opponent {i}</a> (&nbsp;{i % 18 + 1}.)</td>'
+            f'<td class="zentriert">4-3-3</td><td class="zentriert">{20000 + i}</td>'
+            f'<td class="zentriert"><a href="/spielbericht/index/spielbericht/{4000000 + i}">{i % 4}:{i % 3}</a></td></tr>'
+        )
+    table = '<div class="responsive-table"><table class="items"><thead><tr><th>Md</th></tr></thead><tbody>' + "".join(rows) + "</tbody></table></div>"
+    return f"<!DOCTYPE html><html><head><title>Spielplan</title></head><body>{noise}{table}{noise}</body></html>"
+
+def load_pages(args) -> List[Tuple[str, bytes, Optional[str]]]:
+    """(nazwa, surowe bajty, zadeklarowany charset) — tak jak strony trafiają do parserów w pipeline."""
+    pages: List[Tuple[str, bytes, Optional[str]]] = []
+    if args.archive:
+        archive = PageArchive(Path(args.archive))
+        for url in archive._load_index():
+            if "/spielplan/" in url:
+                r = archive.latest(url)
+                if r is not None:
+                    pages.append((url, *html_payload(r)))
+    for path in args.files:
+        pages.append((path, Path(path).read_bytes(), None))
+    if not pages:
+        pages.append(("synthetic", synthetic_spielplan().encode("utf-8"), "utf-8"))
+    return pages
+
+def bench(html: bytes, charset: Optional[str], backend: str, start: date, end: date, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        parse_fixtures(html, BASE, start, end, backend=backend, encoding=charset)
+        times.append(time.perf_counter() - t)
+    return statistics.median(times) * 1000
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("files", nargs="*", help="pliki HTML stron spielplan")
+    ap.add_argument("--archive", default=None, help="katalog archiwum surowych stron (<output>.archive)")
+    ap.add_argument("--repeat", type=int, default=20, help="ile powtórzeń na stronę (mediana)")
+    ap.add_argument("--start", default="2000-01-01")
+    ap.add_argument("--end", default="2100-12-31")
+    args = ap.parse_args()
+
+    start = date.fromisoformat(args.start)
+    end = date.fromisoformat(args.end)
+    pages = load_pages(args)
+
+    totals = {b: 0.0 for b in PARSER_BACKENDS}
+    mismatches = 0
+    print(f"{'strona':60} {'KB':>7} {'mecze':>6} " + " ".join(f"{b + ' ms':>10}" for b in PARSER_BACKENDS))
+    for name, html, charset in pages:
+        outputs = {b: parse_fixtures(html, BASE, start, end, backend=b, encoding=charset) for b in PARSER_BACKENDS}
+        same = len({repr(o) for o in outputs.values()}) == 1
+        mismatches += not same
+        ms = {b: bench(html, charset, b, start, end, args.repeat) for b in PARSER_BACKENDS}
+        for b, v in ms.items():
+            totals[b] += v
+        flag = "" if same else "  RÓŻNE WYNIKI!"
+        print(f"{name[-60:]:60} {len(html) / 1024:7.0f} {len(outputs['bs4']):6d} "
+              + " ".join(f"{ms[b]:10.2f}" for b in PARSER_BACKENDS) + flag)
+
+    n = len(pages)
+    print()
+    print(f"stron: {n}, średnio ms/stronę: " + ", ".join(f"{b}={totals[b] / n:.2f}" for b in PARSER_BACKENDS)
+          + f", przyspieszenie lxml: x{totals['bs4'] / max(totals['lxml'], 1e-9):.1f}")
+    if mismatches:
+        print(f"UWAGA: {mismatches} stron z różnymi wynikami backendów")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -19,11 +19,13 @@ from bs4 import BeautifulSoup
 import pandas as pd
 import json
 import time
+import random
 import re
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
 from typing import Dict, List, Optional, Tuple
 import csv
-from urllib.parse import quote, urljoin
+from urllib.parse import quote, urljoin, urlsplit
 import logging
 import os
 import sys
@@ -75,6 +77,139 @@ def _configure_logging(log_path: Path) -> logging.Logger:
 logger = _configure_logging(Path("goalkeeper_scraper.log"))
 
 
+# Budżety requestów/s per domena (token bucket). Domeny spoza listy: DEFAULT_RATE.
+DEFAULT_HOST_RATES = {
+    'transfermarkt.com': 0.5,
+    'resultados-futbol.com': 1.0,
+    'playmakerstats.com': 1.0,
+    'sofascore.com': 2.0,
+    'fotmob.com': 2.0,
+}
+DEFAULT_RATE = 1.0
+MAX_RETRY_AFTER = 120.0  # dłuższy Retry-After = domena wyłączona (circuit breaker), zamiast wisieć
+
+
+class HostRateLimiter:
+    """Token bucket per domena - czekamy tylko, gdy dana domena wyczerpała swój budżet.
+
+    Zastępuje stałe `time.sleep(1)` przed każdym requestem: przejście z Transfermarkt
+    na SofaScore nie czeka wcale, a po dłuższej przerwie request idzie od razu.
+    """
+
+    def __init__(self, rates: Optional[Dict[str, float]] = None, default_rate: float = DEFAULT_RATE, burst: float = 2.0):
+        self.rates = dict(DEFAULT_HOST_RATES if rates is None else rates)
+        self.default_rate = default_rate
+        self.burst = burst
+        self._buckets: Dict[str, List[float]] = {}  # domena -> [tokens, last_refill]
+        self._current: Dict[str, float] = {}  # domena -> aktualne (adaptacyjne) tempo
+        self._paused_until: Dict[str, float] = {}
+        self._successes: Dict[str, int] = {}
+
+    def domain_of(self, url: str) -> str:
+        host = (urlsplit(url).hostname or '').lower()
+        if host.startswith('www.'):
+            host = host[4:]
+        for domain in self.rates:
+            if host == domain or host.endswith('.' + domain):
+                return domain
+        return host
+
+    def wait(self, url: str) -> float:
+        """Pobiera token dla domeny URL-a; zwraca czas oczekiwania w sekundach."""
+        domain = self.domain_of(url)
+        rate = self._current.get(domain, self.rates.get(domain, self.default_rate))
+        bucket = self._buckets.setdefault(domain, [self.burst, time.monotonic()])
+        paused = self._paused_until.get(domain, 0.0) - time.monotonic()
+        if paused > 0:
+            time.sleep(paused)
+        now = time.monotonic()
+        bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * rate)
+        bucket[1] = now
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return 0.0
+        delay = (1 - bucket[0]) / rate
+        time.sleep(delay)
+        bucket[0] = 0.0
+        bucket[1] = time.monotonic()
+        return delay + max(0.0, paused)
+
+    def throttle(self, url: str, retry_after: Optional[float] = None) -> float:
+        """Po 429/Retry-After: tempo domeny o połowę (min. 1/16 bazowego), opcjonalnie pauza."""
+        domain = self.domain_of(url)
+        base = self.rates.get(domain, self.default_rate)
+        rate = max(base / 16, self._current.get(domain, base) / 2)
+        self._current[domain] = rate
+        self._successes[domain] = 0
+        if retry_after:
+            self._paused_until[domain] = time.monotonic() + min(retry_after, MAX_RETRY_AFTER)
+        return rate
+
+    def reward(self, url: str, window: int = 20):
+        """Po `window` sukcesach z rzędu tempo wraca stopniowo (x1.25) do bazowego."""
+        domain = self.domain_of(url)
+        if domain not in self._current:
+            return
+        self._successes[domain] = self._successes.get(domain, 0) + 1
+        if self._successes[domain] >= window:
+            base = self.rates.get(domain, self.default_rate)
+            self._current[domain] = min(base, self._current[domain] * 1.25)
+            self._successes[domain] = 0
+            if self._current[domain] >= base:
+                del self._current[domain]
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Nagłówek Retry-After: liczba sekund albo data HTTP."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class CircuitBreaker:
+    """Circuit breaker per domena: po `threshold` porażkach z rzędu (403/429/5xx/timeout)
+    domena jest pomijana przez `cooldown` sekund, potem jedna próba (half-open)."""
+
+    def __init__(self, threshold: int = 5, cooldown: float = 120.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        # half-open: po cooldownie przepuszczamy jedną próbę
+        return time.monotonic() - self.opened_at >= self.cooldown
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def trip(self):
+        """Otwiera od razu (np. Retry-After dłuższy niż MAX_RETRY_AFTER)."""
+        self.failures = max(self.failures, self.threshold)
+        self.opened_at = time.monotonic()
+
+    def record_failure(self):
+        self.failures += 1
+        if self.opened_at is not None or self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+
+
 class GoalkeeperDataScraper:
     """Główna klasa do zbierania danych bramkarzy"""
     
@@ -95,22 +230,62 @@ class GoalkeeperDataScraper:
         
         # Cache dla przyśpieszenia
         self.cache = {}
+
+        # Rate limiting per domena (zamiast sleep przed każdym requestem)
+        self.rate_limiter = HostRateLimiter()
+
+        # Circuit breaker per domena + domeny pominięte dla bieżącego zawodnika
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.skipped_domains: set = set()
         
     def safe_request(self, url: str, max_retries: int = 3) -> Optional[requests.Response]:
-        """Bezpieczne wykonywanie requestów z retry"""
+        """Bezpieczne wykonywanie requestów z retry.
+
+        429 / 503+Retry-After: czekamy wg Retry-After i zwalniamy domenę; 5xx / timeout: backoff z jitterem;
+        403 i 404: bez ponowień (403 liczy się do circuit breakera).
+        """
+        domain = self.rate_limiter.domain_of(url)
+        breaker = self.breakers.setdefault(domain, CircuitBreaker())
         for attempt in range(max_retries):
+            if not breaker.allow():
+                logger.warning(f"⛔ {domain} zablokowane (circuit breaker) - pomijam {url}")
+                self.skipped_domains.add(domain)
+                return None
             try:
-                time.sleep(1)  # Rate limiting
+                self.rate_limiter.wait(url)  # Rate limiting per domena
                 response = self.session.get(url, timeout=10)
                 response.raise_for_status()
+                breaker.record_success()
+                self.rate_limiter.reward(url)
                 return response
             except requests.exceptions.RequestException as e:
+                status = e.response.status_code if e.response is not None else None
+                retry_after = parse_retry_after(e.response.headers.get('Retry-After')) if e.response is not None else None
+                throttled = status == 429 or (status == 503 and retry_after is not None)
+                transient = status is None or status == 408 or (status is not None and status >= 500)
+                # 404 itp. to brak danych, nie blokada źródła
+                if throttled or transient or status == 403:
+                    breaker.record_failure()
+                if throttled:
+                    rate = self.rate_limiter.throttle(url, retry_after)
+                    logger.info(f"Throttling {domain}: tempo {rate:.2f} req/s")
+                    if retry_after is not None and retry_after > MAX_RETRY_AFTER:
+                        breaker.trip()
+                        self.skipped_domains.add(domain)
+                        logger.error(f"⛔ {domain}: Retry-After {retry_after:.0f}s > {MAX_RETRY_AFTER:.0f}s - wyłączam domenę")
+                        return None
                 logger.warning(f"Próba {attempt + 1}/{max_retries} nie powiodła się dla {url}: {e}")
-                if attempt < max_retries - 1:
-                    time.sleep(2 ** attempt)  # Exponential backoff
-                else:
+                if attempt < max_retries - 1 and (throttled or transient):
+                    if retry_after is not None:
+                        time.sleep(min(MAX_RETRY_AFTER, retry_after) + random.uniform(0, 1))
+                    else:
+                        time.sleep(random.uniform(0, min(30, 2 ** (attempt + 1))))  # Exponential backoff + jitter
+                elif throttled or transient:
                     logger.error(f"Wszystkie próby wyczerpane dla {url}")
                     return None
+                else:
+                    logger.error(f"Błąd bez ponowień (HTTP {status}) dla {url}")
+                    return None
         return None
     
     # ========================
@@ -403,6 +578,8 @@ class GoalkeeperDataScraper:
         logger.info(f"PRZETWARZAM: {name} ({team}, {country})")
         logger.info(f"{'='*80}")
         
+        self.skipped_domains = set()
+
         result = {
             # Podstawowe
             'Imię i nazwisko': name,
@@ -531,6 +708,10 @@ class GoalkeeperDataScraper:
         result['Mecze drużyny łącznie'] = len(team_matches)
         
         result['Status zbierania'] = 'Zakończono'
+        if self.skipped_domains:
+            skipped = ', '.join(sorted(self.skipped_domains))
+            result['Uwagi'].append(f"Pominięte źródła (circuit breaker): {skipped}")
+            result['Status zbierania'] = f"Zakończono (pominięto: {skipped})"
         
         logger.info(f"✓ Zakończono przetwarzanie {name}")
         logger.info(f"  - Mecze: {result['Mecze zagrane']}")
@@ -17,29 +17,42 @@ Co to robi (zgodnie z Twoją specyfikacją):
 UWAGA PRAKTYCZNA:
 - Transfermarkt / Playmaker / Resultados zwykle da się ogarnąć przez requests+BS4.
 - SofaScore i FotMob często wymagają renderowania JS → Playwright (wspierane).
-- Ten skrypt ma caching ID (kluby/mecze) do pliku JSON, żeby nie dostawać banów.
+- Ten skrypt ma caching ID (kluby/mecze) w SQLite (<output>.cache.sqlite), żeby nie dostawać banów.
 
 """
 
 from __future__ import annotations
 
 import argparse
+import asyncio
 import csv
+import gzip
+import hashlib
 import json
 import logging
+import multiprocessing
 import os
+import random
 import re
+import sqlite3
 import sys
+import threading
 import time
-from dataclasses import dataclass
-from datetime import date, datetime, timedelta
+import unicodedata
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
+from dataclasses import asdict, dataclass
+from datetime import date, datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple, Literal
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Set, Tuple, Literal, Union
 
 import pandas as pd
 import requests
-from bs4 import BeautifulSoup
-from urllib.parse import quote, urljoin
+from bs4 import BeautifulSoup, SoupStrainer
+from urllib.parse import quote, urljoin, urlsplit
 
 # -----------------------
 # LOGGING (Windows-safe)
@@ -88,6 +101,13 @@ def season_id_from_date(d: date) -> int:
     # sezon europejski: lipiec→czerwiec. Styczeń 2026 należy do sezonu 2025.
     return d.year if d.month >= 7 else d.year - 1
 
+def season_ids(start: date, end: date) -> List[int]:
+    """Sezony pokrywane przez okno — okno przez przełom czerwca/lipca obejmuje dwa."""
+    return list(range(season_id_from_date(start), season_id_from_date(end) + 1))
+
+def season_span(season: int) -> Tuple[date, date]:
+    return date(season, 7, 1), date(season + 1, 6, 30)
+
 def parse_date_fuzzy(s: str) -> Optional[date]:
     s = s.strip()
     # 30.01.2026, 30/01/2026, 30 Jan 2026, Jan 30, 2026 ...
@@ -98,6 +118,34 @@ def parse_date_fuzzy(s: str) -> Optional[date]:
             pass
     return None
 
+def host_of(url: str) -> str:
+    # "www.transfermarkt.com" i "transfermarkt.com" to dla nas ten sam host
+    host = (urlsplit(url).hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+def match_host_domain(settings: Dict[str, object], host: str) -> Optional[str]:
+    """Klucz z `settings` pasujący do hosta: dokładnie albo domena nadrzędna (api.sofascore.com -> sofascore.com)."""
+    if host in settings:
+        return host
+    for domain in settings:
+        if host.endswith("." + domain):
+            return domain
+    return None
+
+def lookup_host_setting(settings: Dict[str, object], host: str, default):
+    domain = match_host_domain(settings, host)
+    return settings[domain] if domain is not None else default
+
+def parse_host_pairs(items: List[str], cast) -> Dict[str, object]:
+    # CLI: --host-limit transfermarkt.com=2 (powtarzalne)
+    out: Dict[str, object] = {}
+    for item in items or []:
+        host, sep, value = item.partition("=")
+        if not sep:
+            raise ValueError(f"Oczekiwano host=wartość, dostałem: {item}")
+        out[host.strip().lower().removeprefix("www.")] = cast(value)
+    return out
+
 # -----------------------
 # DATA MODELS
 # -----------------------
@@ -119,6 +167,15 @@ class Participation:
     red: Optional[int] = None
     rating: Optional[float] = None
 
+@dataclass
+class MatchPlan:
+    """Mecz z terminarza TM z perspektywy jednego z naszych klubów."""
+    match: MatchKey
+    tm_url: str
+    competition: Optional[str]
+    score: Optional[str]
+    club_id: int
+
 @dataclass
 class MatchRecord:
     match: MatchKey
@@ -133,63 +190,1152 @@ class MatchRecord:
 # CACHE
 # -----------------------
 
-class JsonCache:
-    def __init__(self, path: Path):
+KV_SCHEMA = """
+CREATE TABLE IF NOT EXISTS kv (
+    path       TEXT PRIMARY KEY,   -- klucze połączone separatorem
+    ns         TEXT NOT NULL,      -- keys[0], np. "tm"
+    kind       TEXT NOT NULL,      -- keys[1], np. "fixtures"
+    value      TEXT NOT NULL,      -- JSON
+    updated_at REAL NOT NULL,
+    expires_at REAL,               -- NULL = bez wygasania
+    accessed_at REAL               -- ostatni odczyt (albo zapis) — kolejność wypierania
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS kv_ns_kind ON kv (ns, kind);
+"""
+
+DAY = 86400.0
+# TTL (s) per (przestrzeń, rodzaj); "*" = dowolna przestrzeń, brak wpisu = bez wygasania.
+# To wartości dla danych "osiadłych" — zapisy dotyczące bieżących okien dostają FRESH_TTL.
+CACHE_TTL: Dict[Tuple[str, str], float] = {
+    ("tm", "player_profile"): 365 * DAY,
+    ("tm", "club_search"): 180 * DAY,
+    ("tm", "clubs_for_period"): 180 * DAY,
+    ("tm", "fixtures"): 180 * DAY,
+    ("tm", "lineup"): 180 * DAY,
+    ("*", "team_id"): 180 * DAY,
+    ("*", "match_url"): 60 * DAY,   # martwe linki nie żyją wiecznie
+    ("*", "event_id"): 60 * DAY,
+    ("*", "match_id"): 60 * DAY,
+    ("*", "participation"): 60 * DAY,
+}
+FRESH_TTL = 12 * 3600.0  # okna obejmujące mecze przyszłe / z ostatnich dni: wynik i składy jeszcze się zmieniają
+RECENT_DAYS = 3
+
+def cache_ttl(ns: str, kind: str) -> Optional[float]:
+    return CACHE_TTL.get((ns, kind), CACHE_TTL.get(("*", kind)))
+
+def window_ttl(end: date) -> Optional[float]:
+    """FRESH_TTL dla okna sięgającego ostatnich dni / przyszłości, inaczej None (TTL przestrzeni)."""
+    return FRESH_TTL if end >= date.today() - timedelta(days=RECENT_DAYS) else None
+
+def fixtures_fresh(fetched_at: float, end: date) -> bool:
+    """Czy terminarz sezonu pobrany o `fetched_at` jest aktualny dla okna kończącego się w `end`.
+
+    Pobrany po "osiadnięciu" okna (end + RECENT_DAYS) — zawsze; wcześniej wyniki mogły się
+    jeszcze zmienić, więc ufamy mu tylko przez FRESH_TTL.
+    """
+    settled = datetime.combine(end + timedelta(days=RECENT_DAYS), datetime.min.time()).timestamp()
+    return fetched_at >= settled or time.time() - fetched_at < FRESH_TTL
+
+# Chybienia (wyszukiwanie zadziałało, ale nic nie znalazło) żyją krócej niż trafienia.
+# Nieudane pobrania (błąd sieci, blokada, otwarty breaker) nie są cache'owane wcale.
+NEGATIVE_TTL: Dict[str, float] = {
+    "not_found": 7 * DAY,   # wyszukiwarka nie zwróciła nic pasującego
+    "no_match": 3 * DAY,    # były wyniki, ale żaden nie pasuje do obu drużyn
+}
+
+def negative_ttl(reason: str, when: Optional[date] = None) -> float:
+    """TTL chybienia; mecz przyszły / z ostatnich dni mógł jeszcze nie trafić do źródła — sprawdzamy szybko."""
+    ttl = NEGATIVE_TTL.get(reason, DAY)
+    return min(ttl, window_ttl(when) or ttl) if when else ttl
+
+class SqliteCache:
+    """Cache klucz-wartość w SQLite (WAL), z API dawnego JsonCache: get(*keys) / set(*keys, value=...).
+
+    Nic nie jest wczytywane na starcie — get() czyta jeden wiersz z indeksu, a każdy set() to osobna,
+    krótka transakcja. Czas startu i pamięć nie rosną z rozmiarem cache, a zapis przeżywa przerwanie.
+    Wpisy wygasają wg CACHE_TTL (albo `ttl=` przy zapisie); przeterminowany wpis to chybienie.
+    Znane chybienia wyszukiwań trzyma osobno (set_miss/get_miss, rodzaj "miss") z kodem powodu.
+    Czas odczytu get() jest zbierany w pamięci i zapisywany paczkami — evict() wypiera najdawniej używane.
+    Przy pierwszym uruchomieniu importuje dawny <output>.cache.json (jeśli istnieje).
+    """
+
+    SEP = "\x1f"
+    TOUCH_BATCH = 500
+
+    def __init__(self, path, legacy_json: Optional[Path] = None, honor_ttl: bool = True, retry_negatives: bool = False):
         self.path = path
-        self.data: Dict = {}
-        if path.exists():
-            try:
-                self.data = json.loads(path.read_text(encoding="utf-8"))
-            except Exception:
-                self.data = {}
+        self.honor_ttl = honor_ttl
+        self.retry_negatives = retry_negatives
+        self.migrated = 0
+        memory = str(path) == ":memory:"
+        fresh = memory or not Path(path).exists()
+        if not memory:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._touched: Set[str] = set()
+        # autocommit: każda instrukcja jest własną transakcją
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        if not memory:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(KV_SCHEMA)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(kv)")}
+        if "expires_at" not in columns:
+            self._conn.execute("ALTER TABLE kv ADD COLUMN expires_at REAL")
+        if "accessed_at" not in columns:
+            self._conn.execute("ALTER TABLE kv ADD COLUMN accessed_at REAL")
+        if fresh and legacy_json is not None and legacy_json.exists():
+            self.migrated = self.import_json(legacy_json)
+
+    def _path(self, keys) -> str:
+        return self.SEP.join(str(k) for k in keys)
+
+    def _live(self, expires_at: Optional[float]) -> bool:
+        return not self.honor_ttl or expires_at is None or expires_at > time.time()
 
     def get(self, *keys, default=None):
-        cur = self.data
-        for k in keys:
-            if not isinstance(cur, dict) or k not in cur:
+        path = self._path(keys)
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires_at FROM kv WHERE path = ?", (path,)).fetchone()
+            if row is None:
+                # krótsza ścieżka = poddrzewo, jak zagnieżdżony dict w JsonCache
+                rows = self._conn.execute("SELECT path, value, expires_at FROM kv WHERE path >= ? AND path < ?",
+                                          (path + self.SEP, path + chr(ord(self.SEP) + 1))).fetchall()
+        if row is not None:
+            if not self._live(row[1]):
                 return default
-            cur = cur[k]
-        return cur
+            self._touch([path])
+            return json.loads(row[0])
+        rows = [(p, v) for p, v, exp in rows if self._live(exp)]
+        if not rows:
+            return default
+        self._touch([p for p, _ in rows])
+        out: Dict = {}
+        for p, v in rows:
+            *parents, leaf = p[len(path) + 1:].split(self.SEP)
+            cur = out
+            for k in parents:
+                cur = cur.setdefault(k, {})
+            cur[leaf] = json.loads(v)
+        return out
 
-    def set(self, *keys, value):
-        cur = self.data
-        for k in keys[:-1]:
-            cur = cur.setdefault(k, {})
-        cur[keys[-1]] = value
+    def _touch(self, paths: List[str]) -> None:
+        with self._lock:
+            self._touched.update(paths)
+            if len(self._touched) >= self.TOUCH_BATCH:
+                self._flush_access()
+
+    def _flush_access(self) -> None:
+        # wołane pod self._lock
+        if not self._touched:
+            return
+        now = time.time()
+        self._conn.execute("BEGIN")
+        self._conn.executemany("UPDATE kv SET accessed_at = ? WHERE path = ?", [(now, p) for p in self._touched])
+        self._conn.execute("COMMIT")
+        self._touched.clear()
+
+    def set(self, *keys, value, ttl: Optional[float] = None):
+        """ttl w sekundach; None = TTL przestrzeni z CACHE_TTL."""
+        self._write([self._row(keys, value, ttl)])
+
+    def _row(self, keys, value, ttl: Optional[float] = None) -> Tuple:
+        ns, kind = str(keys[0]), str(keys[1]) if len(keys) > 2 else ""
+        now = time.time()
+        ttl = ttl if ttl is not None else cache_ttl(ns, kind)
+        return (self._path(keys), ns, kind, json.dumps(value, ensure_ascii=False), now,
+                now + ttl if ttl is not None else None, now)
+
+    def _write(self, rows: List[Tuple]) -> None:
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO kv (path, ns, kind, value, updated_at, expires_at, accessed_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def import_json(self, json_path: Path, keep: Optional[Set[Tuple[str, str]]] = None) -> int:
+        """Import pliku JsonCache (przestrzeń -> rodzaj -> klucz -> wartość) w jednej transakcji."""
+        try:
+            data = json.loads(json_path.read_text(encoding="utf-8"))
+        except Exception:
+            return 0
+        rows = []
+        for ns, kinds in data.items():
+            for kind, entries in (kinds or {}).items():
+                if keep is not None and (ns, kind) not in keep:
+                    continue
+                for key, value in (entries or {}).items():
+                    rows.append(self._row((ns, kind, key), value))
+        self._write(rows)
+        return len(rows)
+
+    def copy_from(self, db_path: Path, keep: Set[Tuple[str, str]]) -> int:
+        """Kopiuje wybrane (przestrzeń, rodzaj) z innej bazy cache — tylko do odczytu, bez zmian w źródle."""
+        src = sqlite3.connect(Path(db_path).resolve().as_uri() + "?mode=ro", uri=True)
+        try:
+            # źródło może być sprzed kolumn expires_at / accessed_at
+            columns = {row[1] for row in src.execute("PRAGMA table_info(kv)")}
+            extra = ", ".join(c if c in columns else "NULL" for c in ("expires_at", "accessed_at"))
+            rows = [r for r in src.execute(f"SELECT path, ns, kind, value, updated_at, {extra} FROM kv")
+                    if (r[1], r[2]) in keep]
+        finally:
+            src.close()
+        self._write(rows)
+        return len(rows)
+
+    def get_miss(self, *keys) -> Optional[str]:
+        """Kod powodu zapamiętanego chybienia dla (ns, rodzaj, klucz) albo None; --retry-negatives je ignoruje."""
+        if self.retry_negatives:
+            return None
+        return self.get(keys[0], "miss", *keys[1:])
+
+    def set_miss(self, *keys, reason: str, when: Optional[date] = None):
+        self.set(keys[0], "miss", *keys[1:], value=reason, ttl=negative_ttl(reason, when))
+
+    def entries(self, ns: str, kind: str) -> List[Tuple[str, object]]:
+        """(klucz, wartość) wszystkich wpisów (przestrzeń, rodzaj), także przeterminowanych — do utrzymania cache."""
+        with self._lock:
+            rows = self._conn.execute("SELECT path, value FROM kv WHERE ns = ? AND kind = ?", (ns, kind)).fetchall()
+        prefix = len(ns) + len(kind) + 2
+        return [(p[prefix:], json.loads(v)) for p, v in rows]
+
+    def delete_many(self, keys_list: List[Tuple]) -> int:
+        paths = list({self._path(keys) for keys in keys_list})
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.execute("BEGIN")
+            self._conn.executemany("DELETE FROM kv WHERE path = ?", [(p,) for p in paths])
+            self._conn.execute("COMMIT")
+            return self._conn.total_changes - before
+
+    def evict(self, max_bytes: int) -> Tuple[int, int]:
+        """Usuwa przeterminowane wpisy, potem najdawniej używane (odczyt albo zapis) ponad limit rozmiaru danych.
+
+        Zwraca (przeterminowane, wyparte).
+        """
+        with self._lock:
+            self._flush_access()
+            before = self._conn.total_changes
+            self._conn.execute("DELETE FROM kv WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),))
+            expired = self._conn.total_changes - before
+            self._conn.execute(
+                "DELETE FROM kv WHERE path IN (SELECT path FROM ("
+                "  SELECT path, SUM(length(path) + length(value))"
+                "    OVER (ORDER BY COALESCE(accessed_at, updated_at) DESC, path) AS total FROM kv"
+                ") WHERE total > ?)", (max_bytes,))
+            return expired, self._conn.total_changes - before - expired
 
     def save(self):
-        self.path.parent.mkdir(parents=True, exist_ok=True)
-        self.path.write_text(json.dumps(self.data, ensure_ascii=False, indent=2), encoding="utf-8")
+        # zapis jest przyrostowy (każdy set() to commit); tu tylko przenosimy WAL do pliku bazy
+        with self._lock:
+            self._flush_access()
+            self._conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+    def close(self):
+        with self._lock:
+            self._flush_access()
+            self._conn.close()
+
+# -----------------------
+# HTTP RESPONSE CACHE (ETag / Last-Modified)
+# -----------------------
+
+class HttpResponseCache:
+    """Cache odpowiedzi HTTP na dysku: body + walidatory (ETag / Last-Modified).
+
+    Przy kolejnym GET wysyłamy If-None-Match / If-Modified-Since; 304 obsługujemy z dysku.
+    Zapisujemy tylko odpowiedzi z walidatorem — bez niego nie umiemy potwierdzić świeżości.
+    Układ: <dir>/<2 znaki sha1>/<sha1>.json (meta) + <sha1>.body (surowe bajty).
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+
+    def _paths(self, url: str) -> Tuple[Path, Path]:
+        key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        d = self.root / key[:2]
+        return d / f"{key}.json", d / f"{key}.body"
+
+    def load(self, url: str) -> Optional[Dict]:
+        meta_path, body_path = self._paths(url)
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            meta["body"] = body_path.read_bytes()
+        except (OSError, ValueError):
+            return None
+        return meta
+
+    @staticmethod
+    def conditional_headers(entry: Optional[Dict]) -> Dict[str, str]:
+        headers: Dict[str, str] = {}
+        if entry:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def store(self, url: str, r: requests.Response) -> bool:
+        etag = r.headers.get("ETag")
+        last_modified = r.headers.get("Last-Modified")
+        if not (etag or last_modified) or "no-store" in r.headers.get("Cache-Control", "").lower():
+            return False
+        meta_path, body_path = self._paths(url)
+        meta_path.parent.mkdir(parents=True, exist_ok=True)
+        meta = {
+            "url": url,
+            "status": r.status_code,
+            "etag": etag,
+            "last_modified": last_modified,
+            "content_type": r.headers.get("Content-Type"),
+            "encoding": r.encoding,
+            "stored_at": datetime.now().isoformat(timespec="seconds"),
+        }
+        # body przed meta: meta bez body traktujemy jak brak wpisu
+        _atomic_write(body_path, r.content)
+        _atomic_write(meta_path, json.dumps(meta, ensure_ascii=False).encode("utf-8"))
+        return True
+
+    @staticmethod
+    def to_response(entry: Dict, url: str) -> requests.Response:
+        r = requests.Response()
+        r.status_code = entry.get("status") or 200
+        r._content = entry["body"]
+        r.url = url
+        r.encoding = entry.get("encoding")
+        if entry.get("content_type"):
+            r.headers["Content-Type"] = entry["content_type"]
+        if entry.get("etag"):
+            r.headers["ETag"] = entry["etag"]
+        if entry.get("last_modified"):
+            r.headers["Last-Modified"] = entry["last_modified"]
+        r.headers["X-From-Cache"] = "revalidated"
+        return r
+
+def _atomic_write(path: Path, data: bytes) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+# -----------------------
+# RAW HTML ARCHIVE (offline re-parse)
+# -----------------------
+
+# (przestrzeń, rodzaj) cache, które w trybie offline zostają: URL-e/ID spoza archiwum (np. z przeglądarki).
+# Wyniki parsowania (participation, lineup, fixtures, ...) są odtwarzane z archiwum.
+OFFLINE_KEEP: Set[Tuple[str, str]] = {
+    ("sofascore", "match_url"), ("sofascore", "event_id"), ("sofascore", "team_id"),
+    ("fotmob", "match_url"), ("fotmob", "match_id"), ("fotmob", "team_id"),
+}
+
+def _archive_codec():
+    """zstd jeśli jest `zstandard`, inaczej gzip (stdlib)."""
+    try:
+        import zstandard  # noqa
+        return "zst"
+    except Exception:
+        return "gz"
+
+class PageArchive:
+    """Archiwum surowych stron: content-addressed (sha256 body), skompresowane.
+
+    objects/<2 znaki>/<sha256>.<gz|zst>  — body (ten sam plik dla identycznych stron)
+    index.jsonl                            — jedna linia na pobranie: url, fetched_at, sha256, ...
+
+    Tryb --offline czyta stąd ostatnią wersję każdego URL-a zamiast iść do sieci.
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.codec = _archive_codec()
+        self._index: Optional[Dict[str, Dict]] = None
+        self._lock = threading.Lock()
+
+    def _object_path(self, sha: str, codec: str) -> Path:
+        return self.root / "objects" / sha[:2] / f"{sha}.{codec}"
+
+    @staticmethod
+    def _compress(data: bytes, codec: str) -> bytes:
+        if codec == "zst":
+            import zstandard
+            return zstandard.ZstdCompressor(level=10).compress(data)
+        return gzip.compress(data, compresslevel=6)
+
+    @staticmethod
+    def _decompress(data: bytes, codec: str) -> bytes:
+        if codec == "zst":
+            import zstandard
+            return zstandard.ZstdDecompressor().decompress(data)
+        return gzip.decompress(data)
+
+    def store(self, url: str, r: requests.Response) -> str:
+        body = r.content
+        sha = hashlib.sha256(body).hexdigest()
+        entry = {
+            "url": url,
+            "fetched_at": datetime.now().isoformat(timespec="seconds"),
+            "sha256": sha,
+            "codec": self.codec,
+            "status": r.status_code,
+            "content_type": r.headers.get("Content-Type"),
+            "encoding": r.encoding,
+        }
+        obj = self._object_path(sha, self.codec)
+        with self._lock:
+            if not obj.exists():
+                obj.parent.mkdir(parents=True, exist_ok=True)
+                _atomic_write(obj, self._compress(body, self.codec))
+            with (self.root / "index.jsonl").open("a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            if self._index is not None:
+                self._index[url] = entry
+        return sha
+
+    def _load_index(self) -> Dict[str, Dict]:
+        with self._lock:
+            if self._index is None:
+                index: Dict[str, Dict] = {}
+                path = self.root / "index.jsonl"
+                if path.exists():
+                    with path.open("r", encoding="utf-8") as f:
+                        for line in f:
+                            try:
+                                entry = json.loads(line)
+                            except ValueError:
+                                continue  # urwana ostatnia linia po crashu
+                            prev = index.get(entry["url"])
+                            if prev is None or entry["fetched_at"] >= prev["fetched_at"]:
+                                index[entry["url"]] = entry
+                self._index = index
+            return self._index
+
+    def latest(self, url: str) -> Optional[requests.Response]:
+        """Ostatnio zarchiwizowana wersja URL-a jako `requests.Response` (albo None)."""
+        entry = self._load_index().get(url)
+        if not entry:
+            return None
+        try:
+            body = self._decompress(self._object_path(entry["sha256"], entry["codec"]).read_bytes(), entry["codec"])
+        except OSError:
+            return None
+        r = requests.Response()
+        r.status_code = entry.get("status") or 200
+        r._content = body
+        r.url = url
+        r.encoding = entry.get("encoding")
+        if entry.get("content_type"):
+            r.headers["Content-Type"] = entry["content_type"]
+        r.headers["X-From-Archive"] = entry["fetched_at"]
+        return r
+
+# -----------------------
+# CIRCUIT BREAKER (per źródło)
+# -----------------------
+
+# źródło = klucz w `urls` pipeline'u; dopasowanie po fragmencie hosta (TM ma wiele domen krajowych)
+SOURCE_HOST_PATTERNS: Tuple[Tuple[str, str], ...] = (
+    ("transfermarkt", "transfermarkt."),
+    ("sofascore", "sofascore.com"),
+    ("fotmob", "fotmob.com"),
+    ("playmaker", "playmakerstats.com"),
+    ("resultados", "resultados-futbol.com"),
+)
+
+def source_of(url_or_host: str) -> str:
+    host = host_of(url_or_host) if "://" in url_or_host else url_or_host
+    for source, pattern in SOURCE_HOST_PATTERNS:
+        if pattern in host:
+            return source
+    return host
+
+def breaker_key(url: str) -> str:
+    """Klucz circuit breakera dla URL-a: endpointy JSON mają własny ("sofascore_api"), osobny od przeglądarki.
+
+    Seria 403 z API nie może wyłączyć fallbacku Playwright — to właśnie wtedy jest potrzebny.
+    """
+    source = source_of(url)
+    parts = urlsplit(url)
+    if parts.netloc.startswith("api.") or parts.path.startswith("/api/"):
+        return f"{source}_api"
+    return source
+
+class CircuitBreaker:
+    """closed -> (N porażek z rzędu) -> open -> (cooldown) -> half_open -> 1 próba -> closed/open.
+
+    W stanie open wszystkie wywołania od razu dostają odmowę — zamiast 3 prób z backoffem
+    dla każdego kolejnego zawodnika, gdy źródło i tak nas blokuje.
+    Próba w half_open, która nie zgłosiła wyniku w `probe_timeout_s`, nie blokuje kolejnej.
+    """
+
+    def __init__(self, threshold: int = 5, cooldown_s: float = 120.0, probe_timeout_s: float = 60.0):
+        self.threshold = max(1, threshold)
+        self.cooldown_s = cooldown_s
+        self.probe_timeout_s = probe_timeout_s
+        self.state: Literal["closed", "open", "half_open"] = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+        self.skipped = 0
+        self._probe_in_flight = False
+        self._probe_started = 0.0
+
+    def allow(self) -> bool:
+        now = time.monotonic()
+        if self.state == "open" and now - self.opened_at >= self.cooldown_s:
+            self.state = "half_open"
+            self._probe_in_flight = False
+        if self.state == "closed":
+            return True
+        if self.state == "half_open" and (not self._probe_in_flight or now - self._probe_started >= self.probe_timeout_s):
+            self._probe_in_flight = True
+            self._probe_started = now
+            return True
+        self.skipped += 1
+        return False
+
+    def record_success(self) -> None:
+        self.state = "closed"
+        self.failures = 0
+        self._probe_in_flight = False
+
+    def trip(self) -> None:
+        """Otwiera od razu (np. Retry-After dłuższy, niż jesteśmy gotowi czekać)."""
+        self.failures = max(self.failures, self.threshold)
+        self.record_failure()
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._probe_in_flight = False
+        if self.state == "half_open" or self.failures >= self.threshold:
+            if self.state != "open":
+                self.trips += 1
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+class SourceBreakers:
+    """Po jednym CircuitBreaker na źródło (transfermarkt, sofascore, ...)."""
+
+    def __init__(self, threshold: int = 5, cooldown_s: float = 120.0):
+        self.threshold = threshold
+        self.cooldown_s = cooldown_s
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def get(self, source: str) -> CircuitBreaker:
+        b = self._breakers.get(source)
+        if b is None:
+            b = self._breakers[source] = CircuitBreaker(self.threshold, self.cooldown_s)
+        return b
+
+    def is_open(self, source: str) -> bool:
+        """Źródło jest wyłączone, gdy otwarte są wszystkie jego używane ścieżki (np. API i przeglądarka)."""
+        used = [b for key, b in self._breakers.items() if key in (source, f"{source}_api")]
+        return bool(used) and all(b.state != "closed" for b in used)
+
+    def summary(self) -> Dict[str, Dict[str, object]]:
+        return {src: {"state": b.state, "trips": b.trips, "skipped": b.skipped}
+                for src, b in self._breakers.items() if b.trips or b.skipped}
+
+class LookupFailed(Exception):
+    """Wyszukiwanie nie dało odpowiedzi (błąd HTTP / brak sesji przeglądarki) — to nie jest "nie znaleziono"."""
+
+class HttpStatusError(requests.RequestException):
+    def __init__(self, status: int, retry_after: Optional[float] = None):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+        self.retry_after = retry_after
+
+# -----------------------
+# SINGLE-FLIGHT
+# -----------------------
+
+class SingleFlight:
+    """Łączy równoczesne wywołania z tym samym kluczem w jedno.
+
+    Pierwszy wołający uruchamia `fn()`, kolejni (dopóki trwa) czekają na ten sam wynik.
+    Po zakończeniu klucz znika — to nie jest cache, tylko deduplikacja "w locie".
+    """
+
+    def __init__(self):
+        self._inflight: Dict[object, asyncio.Future] = {}
+
+    async def do(self, key, fn: Callable[[], Awaitable]):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _t, k=key: self._inflight.pop(k, None))
+        # shield: anulowanie jednego wołającego nie anuluje pobrania pozostałym
+        return await asyncio.shield(task)
 
 # -----------------------
 # HTTP CLIENT
 # -----------------------
 
+def html_payload(r: requests.Response) -> Tuple[bytes, Optional[str]]:
+    """Surowe body + charset zadeklarowany w Content-Type (bez zgadywania).
+
+    Parser dostaje bajty i sam dekoduje raz: charset z nagłówka, a bez niego <meta charset> / BOM.
+    `r.text` przy braku charsetu puszcza detekcję po całym body i robi drugą, zdekodowaną kopię.
+    """
+    m = re.search(r"charset=[\"']?([\w.:-]+)", r.headers.get("Content-Type") or "", flags=re.I)
+    return r.content, (m.group(1) if m else None)
+
+# domyślne budżety (requesty/s) per źródło; reszta hostów dostaje --default-rate
+DEFAULT_HOST_RATES: Dict[str, float] = {
+    "transfermarkt.com": 0.5,
+    "resultados-futbol.com": 1.0,
+    "playmakerstats.com": 1.0,
+    "sofascore.com": 2.0,
+    "fotmob.com": 2.0,
+}
+
+class TokenBucket:
+    """Token bucket: `rate` tokenów/s, maksymalnie `burst` tokenów w zapasie.
+
+    Czekamy tylko wtedy, gdy zapas jest pusty — jeśli od ostatniego requestu
+    minęło dość czasu, request idzie od razu.
+
+    Tempo jest adaptacyjne (AIMD): `throttle()` po 429/Retry-After tnie je o połowę
+    i może wstrzymać cały host, `reward()` po serii sukcesów podnosi je z powrotem do `max_rate`.
+    """
+
+    def __init__(self, rate: float, burst: float = 1.0, *, min_rate: Optional[float] = None, success_window: int = 20):
+        self.max_rate = max(1e-3, float(rate))
+        self.rate = self.max_rate
+        self.min_rate = min_rate if min_rate is not None else self.max_rate / 16
+        self.burst = max(1.0, float(burst))
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.success_window = success_window
+        self._successes = 0
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self) -> float:
+        """Pobiera token; zwraca ile sekund trzeba było czekać."""
+        waited = 0.0
+        # lock trzymamy także podczas czekania — kolejni chętni ustawiają się w kolejce FIFO
+        async with self._lock:
+            while True:
+                pause = self.paused_until - time.monotonic()
+                if pause > 0:
+                    waited += pause
+                    await asyncio.sleep(pause)
+                    continue
+                self._refill()
+                if self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return waited
+                delay = (1.0 - self.tokens) / self.rate
+                waited += delay
+                await asyncio.sleep(delay)
+
+    def throttle(self, pause_s: Optional[float] = None, max_pause_s: Optional[float] = None) -> None:
+        self._refill()
+        self.rate = max(self.min_rate, self.rate / 2)
+        self.tokens = min(self.tokens, 0.0)
+        self._successes = 0
+        if pause_s:
+            # Retry-After potrafi mówić "jutro" — pauza hosta nie może zawiesić całego przebiegu
+            if max_pause_s is not None:
+                pause_s = min(pause_s, max_pause_s)
+            self.paused_until = max(self.paused_until, time.monotonic() + pause_s)
+
+    def reward(self) -> None:
+        self._successes += 1
+        if self._successes >= self.success_window and self.rate < self.max_rate:
+            self._refill()
+            self.rate = min(self.max_rate, self.rate * 1.25)
+            self._successes = 0
+
+class HostRateLimiter:
+    """Jeden TokenBucket na domenę; różne domeny nigdy się nawzajem nie dławią.
+
+    Subdomeny skonfigurowanej domeny dzielą jej budżet (api.sofascore.com i www.sofascore.com).
+    """
+
+    def __init__(self, rates: Optional[Dict[str, float]] = None, default_rate: float = 1.0, burst: float = 2.0):
+        self.rates = {**DEFAULT_HOST_RATES, **(rates or {})}
+        self.default_rate = default_rate
+        self.burst = burst
+        self._buckets: Dict[str, TokenBucket] = {}
+
+    def bucket(self, host: str) -> TokenBucket:
+        key = match_host_domain(self.rates, host) or host
+        b = self._buckets.get(key)
+        if b is None:
+            b = self._buckets[key] = TokenBucket(self.rates.get(key, self.default_rate), self.burst)
+        return b
+
+    async def acquire(self, host: str) -> float:
+        return await self.bucket(host).acquire()
+
+    def on_throttle(self, host: str, retry_after: Optional[float] = None, max_pause_s: Optional[float] = None) -> float:
+        b = self.bucket(host)
+        b.throttle(retry_after, max_pause_s)
+        return b.rate
+
+    def on_success(self, host: str) -> None:
+        self.bucket(host).reward()
+
+# -----------------------
+# RETRY POLICY
+# -----------------------
+
+FailureKind = Literal["throttled", "blocked", "transient", "permanent"]
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After: liczba sekund albo data HTTP."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+class RetryPolicy:
+    """Klasyfikacja porażek + backoff z pełnym jitterem.
+
+    - throttled (429, 503 z Retry-After): ponawiamy, szanując Retry-After; host zwalnia
+    - transient (5xx, 408, timeout, błąd połączenia): ponawiamy z backoffem
+    - blocked (403): nie ponawiamy — liczy się tylko do circuit breakera
+    - permanent (404 i reszta 4xx): nie ponawiamy
+    """
+
+    def __init__(self, base_s: float = 1.0, cap_s: float = 30.0, max_retry_after_s: float = 120.0):
+        self.base_s = base_s
+        self.cap_s = cap_s
+        self.max_retry_after_s = max_retry_after_s
+
+    @staticmethod
+    def classify(status: Optional[int], retry_after: Optional[float] = None) -> FailureKind:
+        if status is None:
+            return "transient"
+        if status == 429 or (status == 503 and retry_after is not None):
+            return "throttled"
+        if status == 403:
+            return "blocked"
+        if status >= 500 or status == 408:
+            return "transient"
+        return "permanent"
+
+    @staticmethod
+    def should_retry(kind: FailureKind) -> bool:
+        return kind in ("throttled", "transient")
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        if retry_after is not None:
+            # jitter także tu, żeby workery czekające na ten sam host nie ruszyły naraz
+            return min(self.max_retry_after_s, retry_after) + random.uniform(0, self.base_s)
+        return random.uniform(0, min(self.cap_s, self.base_s * 2 ** attempt))
+
 class HttpClient:
-    def __init__(self, logger: logging.Logger):
-        self.logger = logger
-        self.session = requests.Session()
-        self.session.headers.update({
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120 Safari/537.36",
-            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
-            "Accept-Language": "pl-PL,pl;q=0.9,en-US;q=0.8,en;q=0.7",
-        })
+    """Asynchroniczny klient HTTP.
+
+    `requests` jest blokujący, więc samo wywołanie idzie do własnej puli wątków sieciowych
+    (nie do domyślnej puli pętli, z której korzystają zapisy na dysk), a współbieżność ograniczamy
+    semaforem per host — czekanie na jedną domenę nie blokuje pętli zdarzeń ani requestów do innych domen.
+    Każdy wątek ma własną `requests.Session` (sesja nie jest bezpieczna wątkowo), z własną pulą połączeń.
+    `network_workers` domyślnie: 8 × per_host_limit (tyle hostów naraz obsługuje run). Zamknięcie: close().
+    """
 
-    def get(self, url: str, *, retries: int = 3, sleep_s: float = 1.0) -> Optional[requests.Response]:
+    HEADERS = {
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120 Safari/537.36",
+        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+        "Accept-Language": "pl-PL,pl;q=0.9,en-US;q=0.8,en;q=0.7",
+    }
+
+    def __init__(self, logger: logging.Logger, per_host_limit: int = 2, host_limits: Optional[Dict[str, int]] = None,
+                 limiter: Optional[HostRateLimiter] = None, response_cache: Optional[HttpResponseCache] = None,
+                 archive: Optional[PageArchive] = None, offline: bool = False,
+                 breakers: Optional[SourceBreakers] = None, retry_policy: Optional[RetryPolicy] = None,
+                 network_workers: Optional[int] = None):
+        self.logger = logger
+        self.breakers = breakers or SourceBreakers()
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.limiter = limiter or HostRateLimiter()
+        self.response_cache = response_cache
+        self.archive = archive
+        self.offline = offline
+        if offline and archive is None:
+            raise ValueError("Tryb offline wymaga archiwum stron (PageArchive).")
+        self.per_host_limit = max(1, per_host_limit)
+        self.host_limits = dict(host_limits or {})
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._flight = SingleFlight()
+        self.network_workers = max(1, network_workers or 8 * self.per_host_limit)
+        # pula startuje leniwie — offline i przy pełnym cache nie powstaje wcale
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._local = threading.local()
+        self._sessions: List[requests.Session] = []
+        self._sessions_lock = threading.Lock()
+
+    def _session(self) -> requests.Session:
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+            session.headers.update(self.HEADERS)
+            with self._sessions_lock:
+                self._sessions.append(session)
+        return session
+
+    def _fetch(self, url: str, headers: Optional[Dict[str, str]]) -> requests.Response:
+        # w wątku sieciowym: sesja tego wątku, nigdy współdzielona
+        return self._session().get(url, timeout=30, headers=headers)
+
+    async def _send(self, url: str, headers: Optional[Dict[str, str]]) -> requests.Response:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.network_workers, thread_name_prefix="http")
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self._fetch, url, headers)
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+        with self._sessions_lock:
+            for session in self._sessions:
+                session.close()
+            self._sessions.clear()
+
+    def _semaphore(self, host: str) -> asyncio.Semaphore:
+        sem = self._semaphores.get(host)
+        if sem is None:
+            limit = lookup_host_setting(self.host_limits, host, self.per_host_limit)
+            sem = self._semaphores[host] = asyncio.Semaphore(max(1, int(limit)))
+        return sem
+
+    async def get(self, url: str, *, retries: int = 3) -> Optional[requests.Response]:
+        # ten sam URL pobierany równolegle (np. dwóch bramkarzy jednego klubu) idzie do sieci raz
+        return await self._flight.do(url, lambda: self._get(url, retries=retries))
+
+    async def _get(self, url: str, *, retries: int) -> Optional[requests.Response]:
+        if self.offline:
+            r = await asyncio.to_thread(self.archive.latest, url)
+            if r is None:
+                self.logger.debug(f"offline: brak w archiwum: {url}")
+            return r
+
+        host = host_of(url)
+        source = breaker_key(url)
+        breaker = self.breakers.get(source)
+        entry = await asyncio.to_thread(self.response_cache.load, url) if self.response_cache else None
+        cond_headers = HttpResponseCache.conditional_headers(entry)
         for attempt in range(1, retries + 1):
+            if not breaker.allow():
+                self.logger.debug(f"circuit open ({source}) — pomijam: {url}")
+                return None
             try:
-                time.sleep(sleep_s)
-                r = self.session.get(url, timeout=30)
-                if r.status_code >= 400:
-                    raise requests.RequestException(f"HTTP {r.status_code}")
+                async with self._semaphore(host):
+                    waited = await self.limiter.acquire(host)
+                    if waited:
+                        self.logger.debug(f"rate limit {host}: czekano {waited:.2f}s")
+                    r = await self._send(url, cond_headers or None)
+                if r.status_code == 304 and entry:
+                    self.logger.debug(f"304 (z dysku): {url}")
+                    r = HttpResponseCache.to_response(entry, url)
+                elif r.status_code >= 400:
+                    raise HttpStatusError(r.status_code, parse_retry_after(r.headers.get("Retry-After")))
+                elif self.response_cache:
+                    await asyncio.to_thread(self.response_cache.store, url, r)
+                breaker.record_success()
+                self.limiter.on_success(host)
+                if self.archive:
+                    await asyncio.to_thread(self.archive.store, url, r)
                 return r
             except Exception as e:
-                self.logger.warning(f"HTTP fail {attempt}/{retries}: {url} -> {e}")
-                if attempt == retries:
+                status = e.status if isinstance(e, HttpStatusError) else None
+                retry_after = e.retry_after if isinstance(e, HttpStatusError) else None
+                kind = self.retry_policy.classify(status, retry_after)
+                if kind == "permanent":
+                    # 404 itp. to zwykły brak strony — źródło odpowiada, więc też zamyka próbę half_open
+                    breaker.record_success()
+                else:
+                    # blokada / throttling / awaria — liczy się do circuit breakera
+                    breaker.record_failure()
+                if kind == "throttled":
+                    rate = self.limiter.on_throttle(host, retry_after, self.retry_policy.max_retry_after_s)
+                    self.logger.info(f"throttling {host}: tempo -> {rate:.2f} req/s"
+                                     + (f", Retry-After {retry_after:.0f}s" if retry_after is not None else ""))
+                    if retry_after is not None and retry_after > self.retry_policy.max_retry_after_s:
+                        # serwer każe czekać dłużej, niż warto — wyłączamy źródło zamiast wisieć
+                        breaker.trip()
+                        self.logger.warning(f"{host}: Retry-After {retry_after:.0f}s > "
+                                            f"{self.retry_policy.max_retry_after_s:.0f}s — circuit open ({source})")
+                        return None
+                self.logger.warning(f"HTTP fail {attempt}/{retries} [{kind}]: {url} -> {e}")
+                if attempt == retries or not self.retry_policy.should_retry(kind):
+                    return None
+                if breaker.state == "open":
+                    self.logger.warning(f"circuit open ({source}) — przerywam ponowienia: {url}")
                     return None
-                time.sleep(min(8, 2 ** attempt))
+                await asyncio.sleep(self.retry_policy.delay(attempt, retry_after))
+        return None
+
+# -----------------------
+# PARSE POOL (CPU parsowania poza pętlą zdarzeń)
+# -----------------------
+
+class ParsePool:
+    """Parsowanie HTML w procesach roboczych: pętla zdarzeń dalej pobiera strony, a CPU rozkłada się na rdzenie.
+
+    Pobrane bajty HTML trafiają do kolejki zadań ProcessPoolExecutor, proces roboczy oddaje zwarty rekord
+    (krotki / dataclassy). Funkcje muszą być modułowe (picklable). workers=0 — parsowanie w bieżącym
+    procesie, jak dawniej; None — rdzenie minus jeden na pętlę zdarzeń (max 4).
+
+    Procesy startują przez "spawn": fork z działającej pętli asyncio i wątków to_thread/SQLite
+    kopiowałby zablokowane locki i otwarte połączenia do dzieci.
+    """
+
+    def __init__(self, logger: logging.Logger, workers: Optional[int] = 0):
+        self.logger = logger
+        if workers is None:
+            workers = min(4, (os.cpu_count() or 1) - 1)
+        self.workers = max(0, workers)
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    async def run(self, fn: Callable, *args):
+        if self.workers and self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+        if self._executor is None:
+            return fn(*args)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        except BrokenProcessPool as e:
+            self.logger.warning(f"pula parserów przestała działać ({e!r}) — parsuję w bieżącym procesie")
+            self.workers = 0
+            self._executor = None
+            return fn(*args)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+# -----------------------
+# TRANSFERMARKT PARSING (czyste funkcje: html -> dane)
+# -----------------------
+
+# "bs4" = pełne drzewo BeautifulSoup (wzorzec), "lxml" = bezpośrednio elementy lxml (szybka ścieżka)
+ParserBackend = Literal["bs4", "lxml"]
+PARSER_BACKENDS = ("bs4", "lxml")
+
+FixtureTuple = Tuple[MatchKey, str, Optional[str], Optional[str]]
+
+# parsery przyjmują surowe bajty (+ zadeklarowany charset) albo gotowy str
+Markup = Union[bytes, str]
+
+# Regiony stron, które resolvery faktycznie czytają — reszta dokumentu nie jest materializowana.
+# Klasa jako regex: podczas parsowania SoupStrainer widzi cały atrybut ("items big"), nie listę klas.
+ITEMS_TABLE = SoupStrainer("table", class_=re.compile(r"(?:^|\s)items(?:\s|$)"))
+CLUB_LINKS = SoupStrainer("a", href=re.compile(r"/startseite/verein/"))
+PLAYER_LINKS = SoupStrainer("a", href=re.compile(r"/profil/spieler/"))
+PROFILE_REGION = SoupStrainer(["a", "table"])  # pierwszy link klubu (nagłówek) + tabele transferów
+
+@dataclass
+class FixtureRow:
+    """Wiersz tabeli terminarza wyciągnięty przez backend; dalsza logika jest wspólna dla obu backendów."""
+    report_href: str
+    cells: List[str]        # td.get_text(" ", strip=True)
+    cells_tight: List[str]  # td.get_text(strip=True)
+    text: str               # row.get_text(" ", strip=True)
+    team_names: List[str]   # niepuste teksty linków /startseite/verein/
+
+def _fixture_rows_bs4(html: Markup, encoding: Optional[str] = None):
+    soup = BeautifulSoup(html, "lxml", parse_only=ITEMS_TABLE, from_encoding=encoding)
+    for row in soup.select("table.items tr"):
+        a_report = row.select_one("a[href*='/spielbericht/']")
+        if not a_report:
+            continue
+        tds = row.find_all("td")
+        team_links = row.select("a[href*='/startseite/verein/']")
+        yield FixtureRow(
+            report_href=a_report.get("href"),
+            cells=[td.get_text(" ", strip=True) for td in tds],
+            cells_tight=[td.get_text(strip=True) for td in tds],
+            text=row.get_text(" ", strip=True),
+            team_names=[x.get_text(strip=True) for x in team_links if x.get_text(strip=True)],
+        )
+
+_XP_ITEMS_ROWS = "//table[contains(concat(' ', normalize-space(@class), ' '), ' items ')]//tr"
+
+def _lxml_text(el, sep: str) -> str:
+    # odpowiednik get_text(sep, strip=True): niepuste, przycięte fragmenty tekstu
+    return sep.join(t for t in (x.strip() for x in el.itertext()) if t)
+
+def _fixture_rows_lxml(html: Markup, encoding: Optional[str] = None):
+    import lxml.html
+    if isinstance(html, str):
+        # lxml nie przyjmuje str z deklaracją kodowania
+        html, encoding = html.encode("utf-8"), "utf-8"
+    if not html.strip():
+        return
+    # encoding=None: libxml2 bierze charset z <meta> / BOM
+    doc = lxml.html.document_fromstring(html, parser=lxml.html.HTMLParser(encoding=encoding))
+    for row in doc.xpath(_XP_ITEMS_ROWS):
+        reports = row.xpath(".//a[contains(@href, '/spielbericht/')]")
+        if not reports:
+            continue
+        tds = row.xpath(".//td")
+        names = (_lxml_text(a, "") for a in row.xpath(".//a[contains(@href, '/startseite/verein/')]"))
+        yield FixtureRow(
+            report_href=reports[0].get("href"),
+            cells=[_lxml_text(td, " ") for td in tds],
+            cells_tight=[_lxml_text(td, "") for td in tds],
+            text=_lxml_text(row, " "),
+            team_names=[n for n in names if n],
+        )
+
+FIXTURE_ROW_BACKENDS: Dict[str, Callable] = {"bs4": _fixture_rows_bs4, "lxml": _fixture_rows_lxml}
+
+def fixture_from_row(row: FixtureRow, base: str, start: date, end: date) -> Optional[FixtureTuple]:
+    """(MatchKey, spielbericht_url, competition, score) z wiersza terminarza albo None (poza oknem / nieczytelny)."""
+    d = None
+    # Try parse date from dedicated cells first
+    for t in row.cells:
+        if not t:
+            continue
+        # common TM formats: 30.01.2026, 30/01/2026, Jan 30, 2026
+        if re.search(r"\d{2}[./]\d{2}[./]\d{4}", t) or re.search(r"\b[A-Za-z]{3} \d{1,2}, \d{4}\b", t):
+            d = parse_date_fuzzy(t)
+            if d:
+                break
+    if not d:
+        # fallback: scan whole row text
+        dm = re.search(r"(\d{2}[./]\d{2}[./]\d{4}|\b[A-Za-z]{3} \d{1,2}, \d{4}\b)", row.text)
+        d = parse_date_fuzzy(dm.group(1)) if dm else None
+    if not d or d < start or d > end:
         return None
 
+    # opponent: w wierszu są nazwy klubów; my wyciągamy home/away heurystycznie:
+    # Na stronach klubowych zwykle jest "H"/"A" albo ikony; robimy best-effort:
+    names = row.team_names
+    # często: [club, opponent] albo więcej; bierzemy dwa ostatnie sensowne
+    if len(names) < 2:
+        return None
+    # Nie zawsze wiadomo, czy klub jest gospodarzem.
+    # Ustalmy: jeśli w wierszu jest "H" lub "Heim" → club home, else jeśli "A" → club away.
+    # Determine H/A from dedicated cell when possible
+    ha = next((t for t in row.cells_tight if t in ("H", "A")), None)
+    is_home = True
+    if ha == "A":
+        is_home = False
+    elif ha == "H":
+        is_home = True
+    else:
+        # fallback heuristic
+        if re.search(r"\bA\b|\bAus\b|\bAway\b|\bAway match\b", row.text, flags=re.I):
+            is_home = False
+    # bierzemy opponent jako ten, który nie jest naszym klubem (first unique)
+    opponent = next((n for n in names if n and n != names[0]), None) or names[-1]
+
+    # nazwę klubu zrobimy później, bo tu jej nie mamy pewnej — wpisujemy placeholder
+    club_placeholder = "CLUB"
+    home = club_placeholder if is_home else opponent
+    away = opponent if is_home else club_placeholder
+
+    report_url = urljoin(base, row.report_href)
+    # competition + score (best-effort)
+    competition = None
+    score = None
+    # wynik często w wierszu jako "2:1":
+    sm = re.search(r"\b(\d+):(\d+)\b", row.text)
+    if sm:
+        score = f"{sm.group(1)}:{sm.group(2)}"
+    return MatchKey(date=d, home=home, away=away), report_url, competition, score
+
+def parse_fixtures(html: Markup, base: str, start: date, end: date, backend: ParserBackend = "lxml",
+                   encoding: Optional[str] = None) -> List[FixtureTuple]:
+    """Mecze z okna [start, end] ze strony spielplan; oba backendy dają identyczny wynik."""
+    rows = FIXTURE_ROW_BACKENDS[backend](html, encoding)
+    return [fx for fx in (fixture_from_row(row, base, start, end) for row in rows) if fx]
+
+def parse_player_search(html: Markup, base: str, encoding: Optional[str] = None) -> Optional[str]:
+    """URL profilu: pierwszy zawodnik w wynikach szybkiego wyszukiwania."""
+    soup = BeautifulSoup(html, "lxml", parse_only=ITEMS_TABLE, from_encoding=encoding)
+    a = soup.select_one("table.items td.hauptlink a[href*='/profil/spieler/']")
+    return urljoin(base, a.get("href")) if a else None
+
+def parse_club_search(html: Markup, encoding: Optional[str] = None) -> Optional[Tuple[str, int]]:
+    soup = BeautifulSoup(html, "lxml", parse_only=CLUB_LINKS, from_encoding=encoding)
+    a = soup.select_one("a[href*='/startseite/verein/']")
+    if not a:
+        return None
+    m = re.search(r"/verein/(\d+)", a.get("href", ""))
+    if not m:
+        return None
+    return a.get_text(strip=True), int(m.group(1))
+
+def parse_profile_clubs(html: Markup, start: date, end: date, encoding: Optional[str] = None) -> List[Tuple[str, int]]:
+    """(club_name, club_id): klub z nagłówka profilu + kluby z transferów z datą w oknie."""
+    soup = BeautifulSoup(html, "lxml", parse_only=PROFILE_REGION, from_encoding=encoding)
+    clubs: Dict[int, str] = {}
+
+    # current club
+    cur = soup.select_one("a[href*='/startseite/verein/']")
+    if cur and cur.get("href"):
+        m = re.search(r"/verein/(\d+)", cur["href"])
+        if m:
+            cid = int(m.group(1))
+            cname = cur.get_text(strip=True) or ""
+            if cname:
+                clubs[cid] = cname
+
+    # transfer history (best-effort)
+    # Na TM bywa tabela "Transfer history" z datami. W PL/EN różne nagłówki.
+    for row in soup.select("table.items tr"):
+        t = row.get_text(" ", strip=True)
+        # próbujemy wyłapać datę transferu w formacie dd.mm.yyyy
+        dm = re.search(r"(\d{2}\.\d{2}\.\d{4})", t)
+        if not dm:
+            continue
+        d = parse_date_fuzzy(dm.group(1))
+        if not d or not (start <= d <= end):
+            continue
+
+        # wiersz może zawierać linki do klubów
+        links = row.select("a[href*='/startseite/verein/']")
+        for a in links:
+            hm = re.search(r"/verein/(\d+)", a.get("href", ""))
+            if hm:
+                cid = int(hm.group(1))
+                cname = a.get_text(strip=True)
+                if cname:
+                    clubs[cid] = cname
+
+    return [(name, cid) for cid, name in clubs.items()]
+
+def parse_tm_lineup(html: Markup, encoding: Optional[str] = None) -> Dict[str, Participation]:
+    """Indeks składu ze strony spielbericht: nazwisko (lower) -> Participation."""
+    # do indeksu potrzebne są wyłącznie linki do profili zawodników
+    soup = BeautifulSoup(html, "lxml", parse_only=PLAYER_LINKS, from_encoding=encoding)
+
+    # lineup: w TM jest tabela składów, często w elementach z nazwiskami jako linki.
+    # heurystyka: jeśli zawodnik jest podlinkowany na stronie meczu -> played
+    lineup: Dict[str, Participation] = {}
+    for a in soup.select("a[href*='/profil/spieler/']"):
+        name = a.get_text(strip=True).lower()
+        if name:
+            lineup.setdefault(name, Participation(status="played"))
+    return lineup
+
 # -----------------------
 # RESOLVERS
 # -----------------------
@@ -202,30 +1348,61 @@ class TransfermarktResolver:
     - parse: match page -> udział zawodnika + (opcjonalnie) kartki, minuty
     """
 
-    def __init__(self, http: HttpClient, cache: JsonCache, logger: logging.Logger, domain: str = "transfermarkt.com"):
+    def __init__(self, http: HttpClient, cache: SqliteCache, logger: logging.Logger, domain: str = "transfermarkt.com",
+                 parser: ParserBackend = "lxml", parse_pool: Optional[ParsePool] = None):
         self.http = http
         self.cache = cache
         self.logger = logger
         self.base = f"https://www.{domain}"
+        self.parser = parser
+        self.parse_pool = parse_pool or ParsePool(logger)
+        self._flight = SingleFlight()
 
-    def search_player_profile(self, player_name: str) -> Optional[str]:
+    async def search_player_profile(self, player_name: str) -> Optional[str]:
         cached = self.cache.get("tm", "player_profile", player_name)
         if cached:
             return cached
+        miss = self.cache.get_miss("tm", "player_profile", player_name)
+        if miss:
+            self.logger.debug(f"TM: znane chybienie ({miss}) dla zawodnika {player_name}")
+            return None
 
         url = f"{self.base}/schnellsuche/ergebnis/schnellsuche?query={quote(player_name)}"
-        r = self.http.get(url)
+        r = await self.http.get(url)
         if not r:
             return None
-        soup = BeautifulSoup(r.text, "lxml")
-        a = soup.select_one("table.items td.hauptlink a[href*='/profil/spieler/']")
-        if not a:
+        body, charset = html_payload(r)
+        profile = await self.parse_pool.run(parse_player_search, body, self.base, charset)
+        if not profile:
+            self.cache.set_miss("tm", "player_profile", player_name, reason="not_found")
             return None
-        profile = urljoin(self.base, a.get("href"))
         self.cache.set("tm", "player_profile", player_name, value=profile)
         return profile
 
-    def extract_clubs_for_period(self, player_profile_url: str, start: date, end: date) -> List[Tuple[str,int]]:
+    async def search_club(self, team: str) -> Optional[Tuple[str, int]]:
+        """Klub po nazwie z CSV: pierwszy /verein/ w szybkim wyszukiwaniu TM."""
+        cached = self.cache.get("tm", "club_search", team)
+        if cached:
+            return cached[0], int(cached[1])
+        if self.cache.get_miss("tm", "club_search", team):
+            return None
+
+        url = f"{self.base}/schnellsuche/ergebnis/schnellsuche?query={quote(team)}"
+        r = await self.http.get(url)
+        if not r:
+            return None
+        club = await self.parse_pool.run(parse_club_search, *html_payload(r))
+        if not club:
+            self.cache.set_miss("tm", "club_search", team, reason="not_found")
+            return None
+        self.cache.set("tm", "club_search", team, value=list(club))
+        return club
+
+    async def extract_clubs_for_period(self, player_profile_url: str, start: date, end: date) -> List[Tuple[str,int]]:
+        return await self._flight.do(("clubs", player_profile_url, start, end),
+                                     lambda: self._extract_clubs_for_period(player_profile_url, start, end))
+
+    async def _extract_clubs_for_period(self, player_profile_url: str, start: date, end: date) -> List[Tuple[str,int]]:
         """Zwraca listę (club_name, club_id) dla okresu.
 
         Implementacja jest pragmatyczna:
@@ -237,189 +1414,206 @@ class TransfermarktResolver:
         if cached:
             return [(x[0], int(x[1])) for x in cached]
 
-        r = self.http.get(player_profile_url)
+        r = await self.http.get(player_profile_url)
         if not r:
             return []
 
-        soup = BeautifulSoup(r.text, "lxml")
-        clubs: Dict[int, str] = {}
-
-        # current club
-        cur = soup.select_one("a[href*='/startseite/verein/']")
-        if cur and cur.get("href"):
-            m = re.search(r"/verein/(\d+)", cur["href"])
-            if m:
-                cid = int(m.group(1))
-                cname = cur.get_text(strip=True) or ""
-                if cname:
-                    clubs[cid] = cname
-
-        # transfer history (best-effort)
-        # Na TM bywa tabela "Transfer history" z datami. W PL/EN różne nagłówki.
-        for row in soup.select("table.items tr"):
-            t = row.get_text(" ", strip=True)
-            # próbujemy wyłapać datę transferu w formacie dd.mm.yyyy
-            dm = re.search(r"(\d{2}\.\d{2}\.\d{4})", t)
-            if not dm:
-                continue
-            d = parse_date_fuzzy(dm.group(1))
-            if not d or not (start <= d <= end):
-                continue
-
-            # wiersz może zawierać linki do klubów
-            links = row.select("a[href*='/startseite/verein/']")
-            for a in links:
-                hm = re.search(r"/verein/(\d+)", a.get("href", ""))
-                if hm:
-                    cid = int(hm.group(1))
-                    cname = a.get_text(strip=True)
-                    if cname:
-                        clubs[cid] = cname
-
-        out = [(name, cid) for cid, name in clubs.items()]
-        self.cache.set("tm", "clubs_for_period", cache_key, value=out)
+        body, charset = html_payload(r)
+        out = await self.parse_pool.run(parse_profile_clubs, body, start, end, charset)
+        self.cache.set("tm", "clubs_for_period", cache_key, value=out, ttl=window_ttl(end))
         return out
 
-    def club_fixtures(self, club_id: int, start: date, end: date) -> List[Tuple[MatchKey, str, Optional[str], Optional[str]]]:
+    async def club_fixtures(self, club_id: int, start: date, end: date) -> Optional[List[FixtureTuple]]:
+        # sparsowany terminarz współdzielony przez wszystkich bramkarzy klubu
+        return await self._flight.do(("fixtures", club_id, start, end), lambda: self._club_fixtures(club_id, start, end))
+
+    async def _club_fixtures(self, club_id: int, start: date, end: date) -> Optional[List[FixtureTuple]]:
         """Zwraca listę:
         (MatchKey, spielbericht_url, competition, score)
+
+        Wycinek [start, end] z terminarzy całych sezonów; okno przez przełom sezonów łączy oba.
+        None = któregoś sezonu nie udało się pobrać.
+        """
+        out: Dict[str, FixtureTuple] = {}
+        for season in season_ids(start, end):
+            fixtures = await self._flight.do(("season", club_id, season, end),
+                                             lambda season=season: self.season_fixtures(club_id, season, end))
+            if fixtures is None:
+                return None
+            # ligi "kalendarzowe" mają mecze poza lipcem–czerwcem; ten sam mecz liczymy raz
+            out.update((fx[1], fx) for fx in fixtures if start <= fx[0].date <= end)
+        return sorted(out.values(), key=lambda fx: fx[0].date)
+
+    async def season_fixtures(self, club_id: int, season: int, end: date) -> Optional[List[FixtureTuple]]:
+        """Cały sparsowany terminarz sezonu klubu, cache per (club_id, sezon).
+
+        `end` = koniec okna, które go potrzebuje — decyduje, czy wpis pobrany przed rozegraniem
+        meczów z okna jest jeszcze aktualny (fixtures_fresh).
         """
-        season = season_id_from_date(start)
-        cache_key = f"{club_id}|{season}|{start}|{end}"
+        cache_key = f"{club_id}|{season}"
         cached = self.cache.get("tm", "fixtures", cache_key)
-        if cached:
+        if cached and fixtures_fresh(cached["fetched_at"], end):
             out = []
-            for item in cached:
+            for item in cached["fixtures"]:
                 mk = MatchKey(date=datetime.strptime(item[0], "%Y-%m-%d").date(), home=item[1], away=item[2])
                 out.append((mk, item[3], item[4], item[5]))
             return out
 
         # UWAGA: na TM endpointy potrafią się różnić per kraj/wersję. Ten URL działa często:
         url = f"{self.base}/-/spielplan/verein/{club_id}/saison_id/{season}"
-        r = self.http.get(url)
+        r = await self.http.get(url)
         if not r:
-            return []
-
-        soup = BeautifulSoup(r.text, "lxml")
-        results = []
-
-        # Tabela meczów: szukamy linków /spielbericht/ oraz daty w wierszu.
-        for row in soup.select("table.items tr"):
-            a_report = row.select_one("a[href*='/spielbericht/']")
-            if not a_report:
-                continue
-
-            # date cell: bywa w osobnym td z klasą "zentriert".
-            tds = row.find_all("td")
-            row_text = row.get_text(" ", strip=True)
-            d = None
-            # Try parse date from dedicated cells first
-            for td in tds:
-                t = td.get_text(" ", strip=True)
-                if not t:
-                    continue
-                # common TM formats: 30.01.2026, 30/01/2026, Jan 30, 2026
-                if re.search(r"\d{2}[./]\d{2}[./]\d{4}", t) or re.search(r"\b[A-Za-z]{3} \d{1,2}, \d{4}\b", t):
-                    d = parse_date_fuzzy(t)
-                    if d:
-                        break
-            if not d:
-                # fallback: scan whole row text
-                dm = re.search(r"(\d{2}[./]\d{2}[./]\d{4}|\b[A-Za-z]{3} \d{1,2}, \d{4}\b)", row_text)
-                d = parse_date_fuzzy(dm.group(1)) if dm else None
-            if not d or d < start or d > end:
-                continue
+            return None
 
-            # opponent: w wierszu są nazwy klubów; my wyciągamy home/away heurystycznie:
-            # Na stronach klubowych zwykle jest "H"/"A" albo ikony; robimy best-effort:
-            team_links = row.select("a[href*='/startseite/verein/']")
-            names = [x.get_text(strip=True) for x in team_links if x.get_text(strip=True)]
-            # często: [club, opponent] albo więcej; bierzemy dwa ostatnie sensowne
-            if len(names) >= 2:
-                # Nie zawsze wiadomo, czy klub jest gospodarzem.
-                # Ustalmy: jeśli w wierszu jest "H" lub "Heim" → club home, else jeśli "A" → club away.
-                # Determine H/A from dedicated cell when possible
-                ha = None
-                for td in tds:
-                    t = td.get_text(strip=True)
-                    if t in ("H", "A"):
-                        ha = t
-                        break
-                is_home = True
-                if ha == "A":
-                    is_home = False
-                elif ha == "H":
-                    is_home = True
-                else:
-                    # fallback heuristic
-                    if re.search(r"\bA\b|\bAus\b|\bAway\b|\bAway match\b", row_text, flags=re.I):
-                        is_home = False
-                # bierzemy opponent jako ten, który nie jest naszym klubem (first unique)
-                opponent = None
-                for n in names:
-                    if n and n not in (names[0],):
-                        opponent = n
-                        break
-                opponent = opponent or names[-1]
-
-                # nazwę klubu zrobimy później, bo tu jej nie mamy pewnej — wpisujemy placeholder
-                club_placeholder = "CLUB"
-                home = club_placeholder if is_home else opponent
-                away = opponent if is_home else club_placeholder
-            else:
-                continue
+        body, charset = html_payload(r)
+        # cała strona sezonu, bez filtra dat — okna wycinamy w pamięci
+        results = await self.parse_pool.run(parse_fixtures, body, self.base, date.min, date.max, self.parser, charset)
 
-            report_url = urljoin(self.base, a_report.get("href"))
-            # competition + score (best-effort)
-            competition = None
-            score = None
-            # wynik często w wierszu jako "2:1":
-            sm = re.search(r"\b(\d+):(\d+)\b", row_text)
-            if sm:
-                score = f"{sm.group(1)}:{sm.group(2)}"
+        self.cache.set("tm", "fixtures", cache_key, value={
+            "fetched_at": time.time(),
+            "fixtures": [(x[0].date.isoformat(), x[0].home, x[0].away, x[1], x[2], x[3]) for x in results],
+        })
+        return results
 
-            results.append((MatchKey(date=d, home=home, away=away), report_url, competition, score))
+    async def match_lineup(self, match_url: str, when: Optional[date] = None) -> Optional[Dict[str, Participation]]:
+        """Indeks składu meczu: nazwisko (lower) -> Participation.
 
-        self.cache.set("tm", "fixtures", cache_key, value=[
-            (x[0].date.isoformat(), x[0].home, x[0].away, x[1], x[2], x[3]) for x in results
-        ])
-        return results
+        Jedna strona spielbericht służy wszystkim bramkarzom obu drużyn — pobieramy i parsujemy ją raz.
+        None = strony nie udało się pobrać.
+        """
+        cached = self.cache.get("tm", "lineup", match_url)
+        if cached is not None:
+            return {name: Participation(**p) for name, p in cached.items()}
+        return await self._flight.do(("lineup", match_url), lambda: self._match_lineup(match_url, when))
 
-    def parse_match_participation(self, match_url: str, player_name: str) -> Participation:
-        r = self.http.get(match_url)
+    async def _match_lineup(self, match_url: str, when: Optional[date]) -> Optional[Dict[str, Participation]]:
+        r = await self.http.get(match_url)
         if not r:
-            return Participation(status="unknown")
+            return None
 
-        soup = BeautifulSoup(r.text, "lxml")
-        txt = soup.get_text(" ", strip=True).lower()
-        pnorm = player_name.lower()
-
-        # lineup: w TM jest tabela składów, często w elementach z nazwiskami jako linki.
-        status = "unknown"
-        # starting XI
-        for a in soup.select("a[href*='/profil/spieler/']"):
-            if a.get_text(strip=True).lower() == pnorm:
-                # heurystyka: jeśli jest w sekcji starting xi -> played
-                status = "played"
-                break
+        lineup = await self.parse_pool.run(parse_tm_lineup, *html_payload(r))
+        # mecz przyszły / z ostatnich dni albo pusty skład (raport nieuzupełniony) — sprawdzimy ponownie wkrótce
+        ttl = (window_ttl(when) if when else None) if lineup else FRESH_TTL
+        self.cache.set("tm", "lineup", match_url, value={name: asdict(p) for name, p in lineup.items()}, ttl=ttl)
+        return lineup
 
+    async def parse_match_participation(self, match_url: str, player_name: str) -> Participation:
+        lineup = await self.match_lineup(match_url)
+        if lineup is None:
+            return Participation(status="unknown")
         # bench / not in squad w TM jest trudniejsze bez dokładnego selektora;
         # traktujemy brak znalezienia nazwiska jako "unknown" na TM i pozwalamy innym źródłom doprecyzować.
-        part = Participation(status=status)
         # conceded/clean_sheet wnioskujemy z wyniku tylko jeśli played i pełne minuty potem potwierdzone z innego źródła.
-        return part
+        return lineup.get(player_name.lower(), Participation(status="unknown"))
 
 # -----------------------
 # PLAYWRIGHT RESOLVERS (Sofa/FotMob)
 # -----------------------
 
+# typy zasobów i hosty, których do znalezienia linku meczu nie potrzebujemy
+BLOCKED_RESOURCE_TYPES = frozenset({"image", "font", "media", "stylesheet"})
+BLOCKED_URL_PATTERNS = (
+    "googletagmanager.", "google-analytics.", "doubleclick.", "googlesyndication.", "adservice.",
+    "amazon-adsystem.", "facebook.net", "hotjar.", "scorecardresearch.", "criteo.", "taboola.", "outbrain.",
+)
+
+async def _block_non_essential(route) -> None:
+    req = route.request
+    if req.resource_type in BLOCKED_RESOURCE_TYPES or any(p in req.url for p in BLOCKED_URL_PATTERNS):
+        await route.abort()
+    else:
+        await route.continue_()
+
+# czeka, aż w wynikach wyszukiwania pojawi się link meczu z oboma drużynami (normalizacja jak norm_team)
+_JS_MATCH_LINK_PRESENT = """([marker, home, away]) => {
+  const norm = s => s.toLowerCase().replace(/&/g, 'and').replace(/\\b(fc|sc|afc|sv|vv|ksv|fk)\\b/g, '')
+                     .replace(/[^a-z0-9\\s]/g, ' ').replace(/\\s+/g, ' ').trim();
+  return Array.from(document.querySelectorAll(`a[href*="${marker}"]`))
+              .some(a => { const t = norm(a.innerText || ''); return t.includes(home) && t.includes(away); });
+}"""
+
+# wszystkie kandydujące linki w jednym round-tripie: [[href absolutny, tekst], ...]
+_JS_COLLECT_LINKS = "els => els.map(a => [a.href, a.innerText || ''])"
+
+class BrowserPool:
+    """Jedna przeglądarka na cały run + pula kontekstów/stron wypożyczanych przez resolvery.
+
+    Chromium startuje leniwie (przy pierwszym wypożyczeniu — przy pełnym cache wcale),
+    a zamykamy go raz, na końcu etapu meczów. Zepsuta strona (wyjątek w trakcie) jest
+    zamykana, a slot wraca do puli pusty (None) — następny wypożyczający tworzy świeży kontekst.
+    Slot wraca zawsze, także gdy utworzenie strony się nie uda, więc czekający nie wiszą w get().
+    """
+
+    def __init__(self, logger: logging.Logger, headless: bool = True, size: int = 2):
+        self.logger = logger
+        self.headless = headless
+        self.size = max(1, size)
+        self._playwright = None
+        self._browser = None
+        self._idle: Optional[asyncio.Queue] = None
+        self._start_lock = asyncio.Lock()
+
+    async def _new_page(self):
+        context = await self._browser.new_context()
+        await context.route("**/*", _block_non_essential)
+        return await context.new_page()
+
+    async def _ensure_started(self) -> None:
+        async with self._start_lock:
+            if self._browser is not None:
+                return
+            from playwright.async_api import async_playwright
+            self._playwright = await async_playwright().start()
+            self._browser = await self._playwright.chromium.launch(headless=self.headless)
+            self._idle = asyncio.Queue()
+            for _ in range(self.size):
+                self._idle.put_nowait(None)
+            self.logger.debug(f"BrowserPool: chromium uruchomiony, stron w puli: {self.size}")
+
+    @asynccontextmanager
+    async def page(self):
+        await self._ensure_started()
+        page = await self._idle.get()
+        healthy = False
+        try:
+            if page is None:
+                page = await self._new_page()
+            yield page
+            healthy = True
+        finally:
+            if not healthy and page is not None:
+                try:
+                    await page.context.close()
+                except Exception:
+                    pass
+                page = None
+            self._idle.put_nowait(page)
+
+    async def close(self) -> None:
+        if self._browser is not None:
+            try:
+                await self._browser.close()
+            finally:
+                await self._playwright.stop()
+            self._browser = None
+            self._playwright = None
+            self.logger.debug("BrowserPool: zamknięty")
+
 class PlaywrightResolvers:
     """Resolver ID dla SofaScore i FotMob przez UI (Playwright)."""
 
-    def __init__(self, cache: JsonCache, logger: logging.Logger, headless: bool = True):
+    def __init__(self, cache: SqliteCache, logger: logging.Logger, headless: bool = True, offline: bool = False,
+                 breakers: Optional[SourceBreakers] = None, pool: Optional[BrowserPool] = None):
         self.cache = cache
         self.logger = logger
         self.headless = headless
+        # przeglądarka należy do runu; bez puli z zewnątrz tworzymy własną (zamyka ją właściciel: close())
+        self.pool = pool or BrowserPool(logger, headless=headless)
+        self.result_timeout_ms = 8000
+        self.breakers = breakers or SourceBreakers()
+        # offline: tylko to, co już jest w cache (przeglądarki nie archiwizujemy)
+        self.offline = offline
+        self._flight = SingleFlight()
 
     async def _ensure_playwright(self):
         try:
@@ -430,150 +1624,920 @@ class PlaywrightResolvers:
             self.logger.error(f"Import error: {e}")
             return False
 
+    async def _guarded(self, source: str, fn: Callable[[], Awaitable[Optional[str]]]) -> Tuple[Optional[str], bool]:
+        """Sesja przeglądarki za circuit breakerem źródła (timeouty/blokady liczą się jak porażki HTTP).
+
+        Zwraca (url, czy sesja się odbyła) — chybienie zapamiętujemy tylko po udanej sesji.
+        """
+        breaker = self.breakers.get(source)
+        if not breaker.allow():
+            self.logger.debug(f"circuit open ({source}) — pomijam przeglądarkę")
+            return None, False
+        try:
+            url = await fn()
+        except Exception as e:
+            breaker.record_failure()
+            self.logger.warning(f"{source}: błąd Playwright: {e}")
+            return None, False
+        breaker.record_success()
+        return url, True
+
     async def resolve_sofascore(self, match: MatchKey) -> Optional[str]:
+        return await self._flight.do(("sofascore", match), lambda: self._resolve_sofascore(match))
+
+    async def _resolve_sofascore(self, match: MatchKey) -> Optional[str]:
         cache_key = f"{match.date}|{match.home}|{match.away}"
         cached = self.cache.get("sofascore", "match_url", cache_key)
         if cached:
             return cached
+        if self.offline or self.cache.get_miss("sofascore", "match_url", cache_key):
+            return None
 
         ok = await self._ensure_playwright()
         if not ok:
-            return None
+            raise LookupFailed("sofascore: brak Playwright")
 
-        from playwright.async_api import async_playwright
+        url, completed = await self._guarded("sofascore", lambda: self._browse_sofascore(match))
+        if not url:
+            if not completed:
+                raise LookupFailed(f"sofascore: sesja przeglądarki nieudana: {match.home} vs {match.away}")
+            self.cache.set_miss("sofascore", "match_url", cache_key, reason="not_found", when=match.date)
+            return None
+        self.cache.set("sofascore", "match_url", cache_key, value=url)
+        return url
 
+    async def _browse_sofascore(self, match: MatchKey) -> Optional[str]:
         query = f"{match.home} {match.away}"
-        search_url = f"https://www.sofascore.com/search?q={quote(query)}"
+        return await self._browse_search(f"https://www.sofascore.com/search?q={quote(query)}", "/match/", match)
 
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=self.headless)
-            page = await browser.new_page()
-            await page.goto(search_url, wait_until="domcontentloaded")
+    async def _browse_search(self, search_url: str, marker: str, match: MatchKey) -> Optional[str]:
+        """Strona wyszukiwania -> URL pierwszego wyniku-meczu z oboma drużynami.
 
-            # Heurystyka: kliknij pierwszy wynik "Matches" zawierający oba teamy.
-            # Struktura Sofascore bywa zmienna → selektory są best-effort.
-            await page.wait_for_timeout(1500)
-            items = await page.query_selector_all("a")
-            target = None
-            for a in items:
-                href = await a.get_attribute("href") or ""
-                txt = (await a.inner_text() or "").lower()
-                if "/match/" in href and norm_team(match.home) in norm_team(txt) and norm_team(match.away) in norm_team(txt):
-                    target = a
-                    break
-            if not target:
-                await browser.close()
-                return None
+        Zamiast stałego sleepa czekamy na pojawienie się pasującego linku; kandydatów
+        zbieramy jednym `eval_on_selector_all`, a URL bierzemy z href (bez klikania i drugiej nawigacji).
+        Struktura wyników bywa zmienna → selektory są best-effort.
+        """
+        from playwright.async_api import TimeoutError as PlaywrightTimeoutError
 
-            await target.click()
-            await page.wait_for_load_state("domcontentloaded")
-            url = page.url
-            await browser.close()
+        home, away = norm_team(match.home), norm_team(match.away)
+        async with self.pool.page() as page:
+            await page.goto(search_url, wait_until="domcontentloaded")
+            try:
+                await page.wait_for_function(_JS_MATCH_LINK_PRESENT, arg=[marker, home, away],
+                                             timeout=self.result_timeout_ms)
+            except PlaywrightTimeoutError:
+                # brak wyniku to nie awaria źródła — nie liczymy do circuit breakera
+                return None
+            links = await page.eval_on_selector_all(f"a[href*='{marker}']", _JS_COLLECT_LINKS)
 
-        self.cache.set("sofascore", "match_url", cache_key, value=url)
-        return url
+        for href, txt in links:
+            t = norm_team(txt)
+            if href and home in t and away in t:
+                return href
+        return None
 
     async def resolve_fotmob(self, match: MatchKey) -> Optional[str]:
+        return await self._flight.do(("fotmob", match), lambda: self._resolve_fotmob(match))
+
+    async def _resolve_fotmob(self, match: MatchKey) -> Optional[str]:
         cache_key = f"{match.date}|{match.home}|{match.away}"
         cached = self.cache.get("fotmob", "match_url", cache_key)
         if cached:
             return cached
+        if self.offline or self.cache.get_miss("fotmob", "match_url", cache_key):
+            return None
 
         ok = await self._ensure_playwright()
         if not ok:
-            return None
+            raise LookupFailed("fotmob: brak Playwright")
 
-        from playwright.async_api import async_playwright
+        url, completed = await self._guarded("fotmob", lambda: self._browse_fotmob(match))
+        if not url:
+            if not completed:
+                raise LookupFailed(f"fotmob: sesja przeglądarki nieudana: {match.home} vs {match.away}")
+            self.cache.set_miss("fotmob", "match_url", cache_key, reason="not_found", when=match.date)
+            return None
+        self.cache.set("fotmob", "match_url", cache_key, value=url)
+        return url
 
+    async def _browse_fotmob(self, match: MatchKey) -> Optional[str]:
         query = f"{match.home} {match.away}"
-        search_url = f"https://www.fotmob.com/search?query={quote(query)}"
+        return await self._browse_search(f"https://www.fotmob.com/search?query={quote(query)}", "/matches/", match)
 
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=self.headless)
-            page = await browser.new_page()
-            await page.goto(search_url, wait_until="domcontentloaded")
-            await page.wait_for_timeout(1500)
-
-            items = await page.query_selector_all("a")
-            target = None
-            for a in items:
-                href = await a.get_attribute("href") or ""
-                txt = (await a.inner_text() or "").lower()
-                if "/matches/" in href and norm_team(match.home) in norm_team(txt) and norm_team(match.away) in norm_team(txt):
-                    target = a
+    async def close(self) -> None:
+        await self.pool.close()
+
+# -----------------------
+# SOFASCORE / FOTMOB — JSON API (fallback: Playwright)
+# -----------------------
+
+def teams_match(a: str, b: str) -> bool:
+    na, nb = norm_team(a), norm_team(b)
+    return bool(na and nb) and (na == nb or na in nb or nb in na)
+
+def iter_dicts(obj):
+    """Wszystkie słowniki w zagnieżdżonym JSON-ie, w kolejności dokumentu (pierwszy wynik wyszukiwarki pierwszy)."""
+    stack = [obj]
+    while stack:
+        cur = stack.pop()
+        # dzieci odkładane od końca, żeby pop() zdejmował je w kolejności z odpowiedzi
+        if isinstance(cur, dict):
+            yield cur
+            stack.extend(reversed(list(cur.values())))
+        elif isinstance(cur, list):
+            stack.extend(reversed(cur))
+
+def _event_date(value) -> Optional[date]:
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value, tz=timezone.utc).date()
+    if isinstance(value, str) and value:
+        try:
+            return datetime.fromisoformat(value.replace("Z", "+00:00")).date()
+        except ValueError:
+            return parse_date_fuzzy(value)
+    return None
+
+class ApiMatchResolvers:
+    """SofaScore/FotMob: najpierw lekkie endpointy JSON wyszukiwarki, Playwright tylko gdy API zawiedzie.
+
+    Te same klucze cache co PlaywrightResolvers (match_url) + ID wydarzenia/meczu dla parserów.
+    `prefetch_team` rozwiązuje wszystkie mecze klubu jednym terminarzem drużyny (O(kluby), nie O(mecze)).
+    """
+
+    SOFASCORE_SEARCH = "https://api.sofascore.com/api/v1/search/all?q={q}"
+    FOTMOB_SEARCH = "https://www.fotmob.com/api/searchapi/{q}"
+
+    def __init__(self, http: HttpClient, cache: SqliteCache, logger: logging.Logger, browser: Optional[PlaywrightResolvers] = None):
+        self.http = http
+        self.cache = cache
+        self.logger = logger
+        self.browser = browser
+        self.max_schedule_pages = 5
+        self._flight = SingleFlight()
+
+    async def _get_json(self, url: str):
+        r = await self.http.get(url)
+        if not r:
+            return None
+        try:
+            return r.json()
+        except ValueError:
+            self.logger.debug(f"API: niepoprawny JSON: {url}")
+            return None
+
+    # --- SofaScore ---
+
+    async def resolve_sofascore(self, match: MatchKey) -> Optional[str]:
+        return await self._flight.do(("sofascore", match), lambda: self._resolve_sofascore(match))
+
+    async def _resolve_sofascore(self, match: MatchKey) -> Optional[str]:
+        cache_key = match_cache_key(match)
+        cached = self.cache.get("sofascore", "match_url", cache_key)
+        if cached:
+            return cached
+        miss = self.cache.get_miss("sofascore", "match_url", cache_key)
+        if miss:
+            self.logger.debug(f"sofascore: znane chybienie ({miss}): {match.home} vs {match.away}")
+            return None
+
+        data = await self._get_json(self.SOFASCORE_SEARCH.format(q=quote(f"{match.home} {match.away}")))
+        found = pick_sofascore_event(data, match)
+        if found:
+            event_id, url = found
+            self.cache.set("sofascore", "event_id", cache_key, value=event_id)
+            self.cache.set("sofascore", "match_url", cache_key, value=url)
+            return url
+        if self.browser:
+            self.logger.debug(f"sofascore: API bez wyniku, fallback Playwright: {match.home} vs {match.away}")
+            # przeglądarka sama zapamięta chybienie po udanej sesji; bez Playwrighta / po nieudanej sesji
+            # rozstrzyga odpowiedź API
+            try:
+                return await self.browser.resolve_sofascore(match)
+            except LookupFailed:
+                if data is None:
+                    raise
+        elif data is None:
+            raise LookupFailed(f"sofascore: API niedostępne: {match.home} vs {match.away}")
+        self.cache.set_miss("sofascore", "match_url", cache_key, reason="not_found", when=match.date)
+        return None
+
+    # --- FotMob ---
+
+    async def resolve_fotmob(self, match: MatchKey) -> Optional[str]:
+        return await self._flight.do(("fotmob", match), lambda: self._resolve_fotmob(match))
+
+    async def _resolve_fotmob(self, match: MatchKey) -> Optional[str]:
+        cache_key = match_cache_key(match)
+        cached = self.cache.get("fotmob", "match_url", cache_key)
+        if cached:
+            return cached
+        miss = self.cache.get_miss("fotmob", "match_url", cache_key)
+        if miss:
+            self.logger.debug(f"fotmob: znane chybienie ({miss}): {match.home} vs {match.away}")
+            return None
+
+        data = await self._get_json(self.FOTMOB_SEARCH.format(q=quote(f"{match.home} {match.away}")))
+        found = pick_fotmob_match(data, match)
+        if found:
+            match_id, url = found
+            self.cache.set("fotmob", "match_id", cache_key, value=match_id)
+            self.cache.set("fotmob", "match_url", cache_key, value=url)
+            return url
+        if self.browser:
+            self.logger.debug(f"fotmob: API bez wyniku, fallback Playwright: {match.home} vs {match.away}")
+            # przeglądarka sama zapamięta chybienie po udanej sesji; bez Playwrighta / po nieudanej sesji
+            # rozstrzyga odpowiedź API
+            try:
+                return await self.browser.resolve_fotmob(match)
+            except LookupFailed:
+                if data is None:
+                    raise
+        elif data is None:
+            raise LookupFailed(f"fotmob: API niedostępne: {match.home} vs {match.away}")
+        self.cache.set_miss("fotmob", "match_url", cache_key, reason="not_found", when=match.date)
+        return None
+
+    # --- cały terminarz drużyny naraz ---
+
+    async def prefetch_team(self, club_name: str, matches: List[MatchKey], start: date, end: date) -> int:
+        """Jeden terminarz drużyny (SofaScore + FotMob) zamiast wyszukiwania per mecz.
+
+        Wypełnia cache match_url/ID dla wszystkich `matches`, które da się dopasować;
+        zwraca liczbę nowych wpisów. Reszta meczów pójdzie zwykłą ścieżką per mecz.
+        """
+        return await self._flight.do(("team", club_name, start, end),
+                                     lambda: self._prefetch_team(club_name, matches, start, end))
+
+    async def _prefetch_team(self, club_name: str, matches: List[MatchKey], start: date, end: date) -> int:
+        filled = 0
+        todo = [m for m in matches if not self.cache.get("sofascore", "match_url", match_cache_key(m))]
+        if todo:
+            events = await self._sofascore_team_events(club_name, start, end)
+            for m in todo:
+                found = pick_sofascore_event(events, m)
+                if found:
+                    self.cache.set("sofascore", "event_id", match_cache_key(m), value=found[0])
+                    self.cache.set("sofascore", "match_url", match_cache_key(m), value=found[1])
+                    filled += 1
+
+        todo = [m for m in matches if not self.cache.get("fotmob", "match_url", match_cache_key(m))]
+        if todo:
+            fixtures = await self._fotmob_team_fixtures(club_name)
+            for m in todo:
+                found = pick_fotmob_match(fixtures, m)
+                if found:
+                    self.cache.set("fotmob", "match_id", match_cache_key(m), value=found[0])
+                    self.cache.set("fotmob", "match_url", match_cache_key(m), value=found[1])
+                    filled += 1
+        self.logger.debug(f"{club_name}: terminarz SofaScore/FotMob dopasował {filled} wpisów")
+        return filled
+
+    async def _team_id(self, source: str, club_name: str, search_url: str) -> Optional[int]:
+        cached = self.cache.get(source, "team_id", club_name)
+        if cached:
+            return int(cached)
+        if self.cache.get_miss(source, "team_id", club_name):
+            return None
+        data = await self._get_json(search_url)
+        team_id = pick_team_id(data, club_name)
+        if team_id:
+            self.cache.set(source, "team_id", club_name, value=team_id)
+        elif data is not None:
+            self.cache.set_miss(source, "team_id", club_name, reason="not_found")
+        return team_id
+
+    async def _sofascore_team_events(self, club_name: str, start: date, end: date) -> List[Dict]:
+        team_id = await self._team_id("sofascore", club_name, self.SOFASCORE_SEARCH.format(q=quote(club_name)))
+        if not team_id:
+            return []
+        today = date.today()
+        events: List[Dict] = []
+        # "last" idzie wstecz od dziś, "next" do przodu; kończymy, gdy strona wyjdzie poza okno
+        directions = [d for d, needed in (("last", start <= today), ("next", end >= today)) if needed]
+        for direction in directions:
+            for page in range(self.max_schedule_pages):
+                data = await self._get_json(f"https://api.sofascore.com/api/v1/team/{team_id}/events/{direction}/{page}")
+                page_events = (data or {}).get("events") or []
+                events.extend(page_events)
+                dates = [d for d in (_event_date(e.get("startTimestamp")) for e in page_events) if d]
+                if not (data or {}).get("hasNextPage") or not dates:
                     break
-            if not target:
-                await browser.close()
-                return None
+                if (direction == "last" and min(dates) < start) or (direction == "next" and max(dates) > end):
+                    break
+        return events
 
-            await target.click()
-            await page.wait_for_load_state("domcontentloaded")
-            url = page.url
-            await browser.close()
+    async def _fotmob_team_fixtures(self, club_name: str):
+        team_id = await self._team_id("fotmob", club_name, self.FOTMOB_SEARCH.format(q=quote(club_name)))
+        if not team_id:
+            return None
+        return await self._get_json(f"https://www.fotmob.com/api/teams?id={team_id}")
 
-        self.cache.set("fotmob", "match_url", cache_key, value=url)
-        return url
+def match_cache_key(match: MatchKey) -> str:
+    return f"{match.date}|{match.home}|{match.away}"
+
+def _date_ok(d: Optional[date], match: MatchKey) -> bool:
+    # strefy czasowe: mecz wieczorny w UTC bywa już następnego dnia
+    return d is None or abs((d - match.date).days) <= 1
+
+def pick_sofascore_event(data, match: MatchKey) -> Optional[Tuple[int, str]]:
+    """(event_id, url) pierwszego wydarzenia SofaScore pasującego do meczu — z wyszukiwarki albo terminarza."""
+    if not data:
+        return None
+    for ev in iter_dicts(data):
+        home, away = ev.get("homeTeam"), ev.get("awayTeam")
+        if not (isinstance(home, dict) and isinstance(away, dict) and ev.get("id")):
+            continue
+        if not (teams_match(home.get("name", ""), match.home) and teams_match(away.get("name", ""), match.away)):
+            continue
+        if not _date_ok(_event_date(ev.get("startTimestamp")), match):
+            continue
+        return int(ev["id"]), sofascore_event_url(ev)
+    return None
+
+def pick_fotmob_match(data, match: MatchKey) -> Optional[Tuple[int, str]]:
+    """(match_id, url) pierwszego meczu FotMob pasującego do meczu — z wyszukiwarki albo terminarza."""
+    if not data:
+        return None
+    for m in iter_dicts(data):
+        home, away = fotmob_team_name(m, "home"), fotmob_team_name(m, "away")
+        if not (home and away and m.get("id")):
+            continue
+        if not (teams_match(home, match.home) and teams_match(away, match.away)):
+            continue
+        status = m.get("status") if isinstance(m.get("status"), dict) else {}
+        if not _date_ok(_event_date(m.get("matchDate") or status.get("utcTime")), match):
+            continue
+        try:
+            match_id = int(m["id"])
+        except (TypeError, ValueError):
+            continue
+        return match_id, fotmob_match_url(m)
+    return None
+
+def pick_team_id(data, club_name: str) -> Optional[int]:
+    """ID drużyny z odpowiedzi wyszukiwarki: pierwszy (kolejność dokumentu) słownik z id+name pasującym do klubu.
+
+    `type` odfiltrowuje tylko jako tekst ("player", "event"...) — encje SofaScore mają liczbowy `type` (np. 0).
+    """
+    if not data:
+        return None
+    for d in iter_dicts(data):
+        name = d.get("name")
+        if not (isinstance(name, str) and d.get("id")) or "homeTeam" in d or "home" in d:
+            continue
+        kind = d.get("type")
+        if (isinstance(kind, str) and kind != "team") or "position" in d:
+            continue
+        sport = d.get("sport")
+        if isinstance(sport, dict) and sport.get("slug") not in (None, "football"):
+            continue
+        if teams_match(name, club_name):
+            try:
+                return int(d["id"])
+            except (TypeError, ValueError):
+                continue
+    return None
+
+def sofascore_event_url(ev: Dict) -> str:
+    slug, custom_id = ev.get("slug"), ev.get("customId")
+    if slug and custom_id:
+        return f"https://www.sofascore.com/football/match/{slug}/{custom_id}#id:{ev['id']}"
+    return f"https://www.sofascore.com/event/{ev['id']}"
+
+def fotmob_team_name(m: Dict, side: str) -> Optional[str]:
+    # wyszukiwarka: homeTeamName/awayTeamName; listy meczów: home/away {name}
+    name = m.get(f"{side}TeamName")
+    if not name and isinstance(m.get(side), dict):
+        name = m[side].get("name")
+    return name
+
+def fotmob_match_url(m: Dict) -> str:
+    page = m.get("pageUrl")
+    if page:
+        return urljoin("https://www.fotmob.com", page)
+    return f"https://www.fotmob.com/match/{m['id']}"
+
+# -----------------------
+# MATCH PARSERS (jeden payload na mecz, wspólny dla wszystkich zawodników)
+# -----------------------
+
+def norm_person(s: str) -> str:
+    # bez diakrytyków (ł nie rozkłada się w NFKD), lower, pojedyncze spacje
+    s = unicodedata.normalize("NFKD", s.replace("ł", "l").replace("Ł", "L"))
+    s = "".join(ch for ch in s if not unicodedata.combining(ch))
+    return re.sub(r"\s+", " ", s).strip().lower()
+
+def lookup_participation(index: Optional[Dict[str, Participation]], player_name: str) -> Participation:
+    """Udział zawodnika z indeksu składu meczu: dokładne nazwisko, potem bez diakrytyków."""
+    if not index:
+        return Participation(status="unknown")
+    p = index.get(player_name.lower())
+    if p:
+        return p
+    target = norm_person(player_name)
+    for name, p in index.items():
+        if norm_person(name) == target:
+            return p
+    return Participation(status="unknown")
+
+def sofascore_event_id(url: Optional[str]) -> Optional[int]:
+    m = re.search(r"#id:(\d+)|/event/(\d+)", url or "")
+    return int(m.group(1) or m.group(2)) if m else None
+
+def compact_participation(p: Participation) -> Dict:
+    # w cache tylko znane pola — reszta wraca z wartości domyślnych dataclass
+    return {k: v for k, v in asdict(p).items() if v is not None}
+
+class MatchParser(ABC):
+    """Wspólna część parserów meczu: cache {nazwisko: Participation} per ID/URL meczu + single-flight.
+
+    Podklasa ustawia `source` i implementuje `_fetch(match_id)`; drugi bramkarz z tego samego
+    meczu i kolejne uruchomienia czytają wyłącznie z cache.
+    """
+
+    source = ""
+
+    def __init__(self, http: HttpClient, cache: SqliteCache, logger: logging.Logger,
+                 parse_pool: Optional[ParsePool] = None):
+        self.http = http
+        self.cache = cache
+        self.logger = logger
+        self.parse_pool = parse_pool or ParsePool(logger)
+        self._flight = SingleFlight()
+
+    async def participations(self, match_id: Optional[Union[int, str]],
+                             when: Optional[date] = None) -> Optional[Dict[str, Participation]]:
+        """`when` = data meczu: mecz przyszły / z ostatnich dni trzymamy krótko (wynik, minuty i oceny jeszcze dochodzą)."""
+        if not match_id:
+            return None
+        cached = self.cache.get(self.source, "participation", str(match_id))
+        if cached is not None:
+            return {name: Participation(**p) for name, p in cached.items()}
+        return await self._flight.do(("participation", match_id), lambda: self._participations(match_id, when))
+
+    async def _participations(self, match_id: Union[int, str], when: Optional[date]) -> Optional[Dict[str, Participation]]:
+        index = await self._fetch(match_id)
+        if index is None:
+            return None
+        # bez daty: nikt jeszcze nie zagrał = składy przedmeczowe
+        ttl = window_ttl(when) if when else (None if any(p.status == "played" for p in index.values()) else FRESH_TTL)
+        self.cache.set(self.source, "participation", str(match_id),
+                       value={n: compact_participation(p) for n, p in index.items()}, ttl=ttl)
+        return index
+
+    @abstractmethod
+    async def _fetch(self, match_id: Union[int, str]) -> Optional[Dict[str, Participation]]:
+        """Indeks {nazwisko: Participation} meczu; None — nie udało się pobrać."""
+
+    async def _get_json(self, url: str):
+        r = await self.http.get(url)
+        if not r:
+            return None
+        try:
+            return r.json()
+        except ValueError:
+            return None
+
+class SofaScoreMatchParser(MatchParser):
+    """Składy, minuty, oceny, kartki i gole stracone z API SofaScore — raz na wydarzenie.
+
+    event/{id}/lineups zawiera wszystkich zawodników meczu; event/{id} daje wynik
+    (gole stracone przez bramkarza, który grał cały mecz), event/{id}/incidents kartki i asysty.
+    """
+
+    source = "sofascore"
+    API = "https://api.sofascore.com/api/v1/event/{id}"
+
+    async def _fetch(self, event_id: int) -> Optional[Dict[str, Participation]]:
+        base = self.API.format(id=event_id)
+        lineups, event, incidents = await asyncio.gather(
+            self._get_json(f"{base}/lineups"), self._get_json(base), self._get_json(f"{base}/incidents"))
+        if not lineups:
+            return None
+        return parse_sofascore_lineups(lineups, (event or {}).get("event"), (incidents or {}).get("incidents"))
+
+class FotMobMatchParser(MatchParser):
+    """Składy, minuty, oceny, kartki i gole stracone z matchDetails FotMob — jeden JSON na mecz, bez renderowania."""
+
+    source = "fotmob"
+    API = "https://www.fotmob.com/api/matchDetails?matchId={id}"
+
+    async def _fetch(self, match_id: int) -> Optional[Dict[str, Participation]]:
+        data = await self._get_json(self.API.format(id=match_id))
+        if not isinstance(data, dict) or not (data.get("content") or {}).get("lineup"):
+            return None
+        return parse_fotmob_match_details(data)
+
+SOFASCORE_NOT_PLAYED = ("notstarted", "postponed", "canceled", "cancelled", "delayed")
+
+def sofascore_started(lineups: Dict, event: Optional[Dict]) -> bool:
+    """Czy mecz się zaczął: status wydarzenia, a bez niego — czy ktokolwiek ma rozegrane minuty."""
+    status = ((event or {}).get("status") or {}).get("type")
+    if status:
+        return status not in SOFASCORE_NOT_PLAYED
+    return any((entry.get("statistics") or {}).get("minutesPlayed")
+               for side in ("home", "away") for entry in (lineups.get(side) or {}).get("players") or [])
+
+def parse_sofascore_lineups(lineups: Dict, event: Optional[Dict], incidents: Optional[List[Dict]]) -> Dict[str, Participation]:
+    # skład przedmeczowy (potwierdzony albo przewidywany) to jeszcze nie występ
+    started = sofascore_started(lineups, event)
+    score = {}
+    if event:
+        for side in ("home", "away"):
+            cur = (event.get(f"{side}Score") or {}).get("current")
+            if cur is not None:
+                score[side] = int(cur)
+    full_time = 90
+
+    # kartki / asysty z incydentów (jeśli są) — zliczane per zawodnik
+    yellow: Dict[str, int] = {}
+    red: Dict[str, int] = {}
+    assists: Dict[str, int] = {}
+    for inc in incidents or []:
+        kind = inc.get("incidentType")
+        if kind == "card":
+            name = ((inc.get("player") or {}).get("name") or inc.get("playerName") or "").lower()
+            cls = inc.get("incidentClass")
+            if name and cls in ("yellow", "yellowRed"):
+                yellow[name] = yellow.get(name, 0) + 1
+            if name and cls in ("red", "yellowRed"):
+                red[name] = red.get(name, 0) + 1
+        elif kind == "goal":
+            name = ((inc.get("assist1") or {}).get("name") or "").lower()
+            if name:
+                assists[name] = assists.get(name, 0) + 1
+
+    index: Dict[str, Participation] = {}
+    for side, other in (("home", "away"), ("away", "home")):
+        team = lineups.get(side) or {}
+        for entry in team.get("players") or []:
+            player = entry.get("player") or {}
+            name = (player.get("name") or "").lower()
+            if not name:
+                continue
+            if not started:
+                index[name] = Participation(status="unknown")
+                continue
+            stats = entry.get("statistics") or {}
+            minutes = stats.get("minutesPlayed")
+            played = (not entry.get("substitute")) or bool(minutes)
+            p = Participation(status="played" if played else "bench")
+            if played:
+                p.minutes = int(minutes) if minutes is not None else None
+                p.rating = float(stats["rating"]) if stats.get("rating") is not None else None
+                is_gk = (entry.get("position") or player.get("position")) == "G"
+                # bramkarz z pełnym meczem stracił wszystkie gole rywala; przy zmianie nie zgadujemy
+                if is_gk and other in score and p.minutes is not None and p.minutes >= full_time:
+                    p.goals_conceded = score[other]
+                    p.clean_sheet = score[other] == 0
+            if incidents is not None:
+                p.yellow = yellow.get(name, 0)
+                p.red = red.get(name, 0)
+                p.assists = assists.get(name, 0) if played else None
+            index[name] = p
+        for entry in team.get("missingPlayers") or []:
+            name = ((entry.get("player") or {}).get("name") or "").lower()
+            if name:
+                index.setdefault(name, Participation(status="not_in_squad"))
+    return index
+
+def fotmob_match_id(url: Optional[str]) -> Optional[int]:
+    m = re.search(r"/match/(\d+)|#(\d+)$", url or "")
+    return int(m.group(1) or m.group(2)) if m else None
+
+def _fotmob_stat(stats: Optional[Dict], *titles: str):
+    """Wartość statystyki z playerStats[id] (sekcje -> {tytuł: {stat: {value}}})."""
+    for section in (stats or {}).get("stats") or []:
+        items = section.get("stats") or {}
+        for title in titles:
+            value = ((items.get(title) or {}).get("stat") or {}).get("value")
+            if value is not None:
+                return value
+    return None
+
+def fotmob_state(data: Dict) -> Tuple[bool, bool]:
+    """(rozpoczęty, zakończony) ze statusu meczu; bez statusu — rozegrany, jeśli są statystyki zawodników."""
+    status = (data.get("header") or {}).get("status") or data.get("general") or {}
+    if "started" in status or "finished" in status:
+        finished = bool(status.get("finished"))
+        return finished or bool(status.get("started")), finished
+    played = bool((data.get("content") or {}).get("playerStats"))
+    return played, played
+
+def _fotmob_minutes(player: Dict, starter: bool, finished: bool, full_time: int = 90) -> Tuple[bool, Optional[int]]:
+    """(wszedł na boisko, minuty) ze zmian; bez zmiany pełny czas tylko po końcu meczu."""
+    subs = (player.get("performance") or {}).get("substitutionEvents") or []
+    sub_in = next((e.get("time") for e in subs if e.get("type") == "subIn"), None)
+    sub_out = next((e.get("time") for e in subs if e.get("type") == "subOut"), None)
+    if starter:
+        return True, int(sub_out) if sub_out is not None else (full_time if finished else None)
+    if sub_in is not None:
+        if sub_out is not None:
+            return True, max(int(sub_out) - int(sub_in), 1)
+        return True, max(full_time - int(sub_in), 1) if finished else None
+    return False, None
+
+def parse_fotmob_match_details(data: Dict) -> Dict[str, Participation]:
+    content = data.get("content") or {}
+    lineup = content.get("lineup") or {}
+    player_stats = content.get("playerStats") or {}
+    teams = (data.get("header") or {}).get("teams") or []
+    scores = [t.get("score") for t in teams[:2]]
+    full_time = 90
+    # skład przedmeczowy / przewidywany to jeszcze nie występ
+    started, finished = fotmob_state(data)
+
+    # kartki / asysty z matchFacts, liczone po ID zawodnika
+    yellow: Dict[int, int] = {}
+    red: Dict[int, int] = {}
+    assists: Dict[int, int] = {}
+    events = ((content.get("matchFacts") or {}).get("events") or {}).get("events")
+    for ev in events or []:
+        pid = ev.get("playerId") or (ev.get("player") or {}).get("id")
+        if ev.get("type") == "Card" and pid:
+            card = ev.get("card")
+            if card in ("Yellow", "YellowRed"):
+                yellow[pid] = yellow.get(pid, 0) + 1
+            if card in ("Red", "YellowRed"):
+                red[pid] = red.get(pid, 0) + 1
+        elif ev.get("type") == "Goal" and ev.get("assistPlayerId"):
+            aid = ev["assistPlayerId"]
+            assists[aid] = assists.get(aid, 0) + 1
+
+    index: Dict[str, Participation] = {}
+    for side, key in enumerate(("homeTeam", "awayTeam")):
+        team = lineup.get(key) or {}
+        conceded = scores[1 - side] if len(scores) == 2 else None
+        for starter, group in ((True, team.get("starters")), (False, team.get("subs"))):
+            for player in group or []:
+                name = (player.get("name") or "").lower()
+                if not name:
+                    continue
+                if not started:
+                    index[name] = Participation(status="unknown")
+                    continue
+                pid = player.get("id")
+                stats = player_stats.get(str(pid))
+                came_on, minutes = _fotmob_minutes(player, starter, finished, full_time)
+                stat_minutes = _fotmob_stat(stats, "Minutes played")
+                if stat_minutes is not None:
+                    minutes = stat_minutes
+                played = came_on or bool(minutes)
+                p = Participation(status="played" if played else "bench")
+                if played:
+                    p.minutes = int(minutes) if minutes is not None else None
+                    rating = (player.get("performance") or {}).get("rating") or _fotmob_stat(stats, "FotMob rating")
+                    p.rating = float(rating) if rating is not None else None
+                    gc = _fotmob_stat(stats, "Goals conceded")
+                    is_gk = player.get("usualPlayingPositionId") == 0 or player.get("positionId") == 11
+                    if gc is None and is_gk and conceded is not None and p.minutes is not None and p.minutes >= full_time:
+                        gc = conceded
+                    if gc is not None:
+                        p.goals_conceded = int(gc)
+                        p.clean_sheet = p.goals_conceded == 0
+                    p.assists = assists.get(pid, 0) if events is not None else None
+                if events is not None:
+                    p.yellow = yellow.get(pid, 0)
+                    p.red = red.get(pid, 0)
+                index[name] = p
+        for player in team.get("unavailable") or []:
+            name = (player.get("name") or "").lower()
+            if name:
+                index.setdefault(name, Participation(status="not_in_squad"))
+    return index
 
 # -----------------------
 # RESULTADOS & PLAYMAKER (requests)
 # -----------------------
 
 class ResultadosResolver:
-    def __init__(self, http: HttpClient, cache: JsonCache, logger: logging.Logger):
+    # z wyników wyszukiwania czytamy tylko linki do meczów
+    search_region = SoupStrainer("a", href=re.compile(r"/partido/"))
+
+    def __init__(self, http: HttpClient, cache: SqliteCache, logger: logging.Logger):
         self.http = http
         self.cache = cache
         self.logger = logger
         self.base = "https://www.resultados-futbol.com"
+        self._flight = SingleFlight()
 
-    def resolve(self, match: MatchKey) -> Optional[str]:
+    async def resolve(self, match: MatchKey) -> Optional[str]:
+        return await self._flight.do(match, lambda: self._resolve(match))
+
+    async def _resolve(self, match: MatchKey) -> Optional[str]:
         cache_key = f"{match.date}|{match.home}|{match.away}"
         cached = self.cache.get("resultados", "match_url", cache_key)
         if cached:
             return cached
+        if self.cache.get_miss("resultados", "match_url", cache_key):
+            return None
 
         # Fallback: search page
         q = f"{match.home} {match.away} {match.date.isoformat()}"
         url = f"{self.base}/search?q={quote(q)}"
-        r = self.http.get(url)
+        r = await self.http.get(url)
         if not r:
-            return None
-        soup = BeautifulSoup(r.text, "lxml")
-        for a in soup.select("a[href*='/partido/']"):
+            raise LookupFailed(url)
+        body, charset = html_payload(r)
+        soup = BeautifulSoup(body, "lxml", parse_only=self.search_region, from_encoding=charset)
+        links = soup.select("a[href*='/partido/']")
+        for a in links:
             txt = a.get_text(" ", strip=True)
             if norm_team(match.home) in norm_team(txt) and norm_team(match.away) in norm_team(txt):
                 murl = urljoin(self.base, a.get("href"))
                 self.cache.set("resultados", "match_url", cache_key, value=murl)
                 return murl
+        self.cache.set_miss("resultados", "match_url", cache_key, reason="no_match" if links else "not_found",
+                            when=match.date)
         return None
 
 class PlaymakerResolver:
-    def __init__(self, http: HttpClient, cache: JsonCache, logger: logging.Logger):
+    search_region = SoupStrainer("a", href=re.compile(r"/match/"))
+
+    def __init__(self, http: HttpClient, cache: SqliteCache, logger: logging.Logger):
         self.http = http
         self.cache = cache
         self.logger = logger
         self.base = "https://www.playmakerstats.com"
+        self._flight = SingleFlight()
+
+    async def resolve(self, match: MatchKey) -> Optional[str]:
+        return await self._flight.do(match, lambda: self._resolve(match))
 
-    def resolve(self, match: MatchKey) -> Optional[str]:
+    async def _resolve(self, match: MatchKey) -> Optional[str]:
         cache_key = f"{match.date}|{match.home}|{match.away}"
         cached = self.cache.get("playmaker", "match_url", cache_key)
         if cached:
             return cached
+        if self.cache.get_miss("playmaker", "match_url", cache_key):
+            return None
 
         # Playmaker ma search? Uwaga: endpointy mogą się zmieniać; to jest best-effort.
         url = f"{self.base}/search?search_string={quote(match.home + ' ' + match.away)}"
-        r = self.http.get(url)
+        r = await self.http.get(url)
         if not r:
-            return None
-        soup = BeautifulSoup(r.text, "lxml")
-        for a in soup.select("a[href*='/match/']"):
+            raise LookupFailed(url)
+        body, charset = html_payload(r)
+        soup = BeautifulSoup(body, "lxml", parse_only=self.search_region, from_encoding=charset)
+        links = soup.select("a[href*='/match/']")
+        for a in links:
             href = a.get("href", "")
             txt = a.get_text(" ", strip=True)
             if norm_team(match.home) in norm_team(txt) and norm_team(match.away) in norm_team(txt):
                 murl = urljoin(self.base, href)
                 self.cache.set("playmaker", "match_url", cache_key, value=murl)
                 return murl
+        self.cache.set_miss("playmaker", "match_url", cache_key, reason="no_match" if links else "not_found",
+                            when=match.date)
         return None
 
+# Strony meczów (HTML): parsujemy tylko sekcje składów/zdarzeń (SoupStrainer), bez pełnego drzewa strony.
+# Układy stron bywają różne — to jest best-effort, rozpoznawanie po klasach/id i nagłówkach sekcji.
+BENCH_RX = re.compile(r"suplente|banquillo|reserva|bench|substitute|subs\b", re.I)
+ABSENT_RX = re.compile(r"lesionad|sancionad|ausente|\bbajas?\b|unavailable|injur|suspend", re.I)
+SUB_IN_RX = re.compile(r"sub[-_ ]?in|\bentra|entrou|\bin\b", re.I)
+SUB_OUT_RX = re.compile(r"sub[-_ ]?out|\bsale|saiu|\bout\b", re.I)
+YELLOW_RX = re.compile(r"yellow|amarilla|amarelo", re.I)
+RED_RX = re.compile(r"(?<!yellow)(?<!yellow-)\bred\b|roja|vermelho", re.I)
+RATING_RX = re.compile(r"rating|nota|valoraci|puntuaci", re.I)
+EVENTS_RX = re.compile(r"evento|\bevents?\b|incidenc|timeline", re.I)
+LINEUP_RX = re.compile(r"alinea|lineup|titular|starting", re.I)
+
+def _attr_text(tag) -> str:
+    return " ".join(tag.get("class") or []) + " " + (tag.get("id") or "")
+
+def _section_kind(a) -> str:
+    """'bench' / 'absent' / 'events' / 'lineup' z klas najbliższego rozpoznanego przodka albo nagłówka sekcji.
+
+    W kontenerze składu (np. class="lineup") liczy się tylko nagłówek z tego samego kontenera.
+    """
+    container = None
+    for parent in a.parents:
+        if parent.name is None:
+            break
+        attrs = _attr_text(parent)
+        if ABSENT_RX.search(attrs):
+            return "absent"
+        if BENCH_RX.search(attrs):
+            return "bench"
+        if EVENTS_RX.search(attrs):
+            return "events"
+        if LINEUP_RX.search(attrs):
+            container = parent
+            break
+    heading = a.find_previous(re.compile(r"^h[2-6]$"))
+    if heading and (container is None or container in heading.parents):
+        txt = heading.get_text(" ", strip=True)
+        if ABSENT_RX.search(txt):
+            return "absent"
+        if BENCH_RX.search(txt):
+            return "bench"
+        if EVENTS_RX.search(txt):
+            return "events"
+    return "lineup"
+
+def _minute(tag) -> Optional[int]:
+    m = re.search(r"(\d{1,3})", tag.get_text(" ", strip=True) or tag.get("title") or "")
+    return int(m.group(1)) if m else None
+
+def _row_markers(a, player_href: str) -> list:
+    """Znaczniki (zmiana, kartki, ocena) z wiersza zawodnika; przy kilku nazwiskach w wierszu tylko otoczenie linku."""
+    row = a.find_parent(["li", "tr"]) or a.parent
+    if len(row.select(f"a[href*='{player_href}']")) > 1:
+        row = a.parent
+        if len(row.select(f"a[href*='{player_href}']")) > 1:
+            return []
+    return [t for t in row.find_all(True) if t is not a]
+
+def _marks(markers: list) -> Tuple[Optional[int], Optional[int], int, int]:
+    """(zejście na boisko, zejście z boiska, żółte, czerwone)."""
+    sub_in = next((_minute(t) for t in markers if SUB_IN_RX.search(_attr_text(t))), None)
+    sub_out = next((_minute(t) for t in markers if SUB_OUT_RX.search(_attr_text(t))), None)
+    yellow = sum(1 for t in markers if YELLOW_RX.search(_attr_text(t)))
+    red = sum(1 for t in markers if RED_RX.search(_attr_text(t)))
+    return sub_in, sub_out, yellow, red
+
+def parse_lineup_sections(soup: BeautifulSoup, player_href: str, full_time: int = 90) -> Dict[str, Participation]:
+    """Participation per zawodnik z (już przefiltrowanych) sekcji składów strony meczu.
+
+    Indeks powstaje tylko z sekcji składu / ławki / nieobecnych; linki z listy zdarzeń jedynie
+    uzupełniają zmiany i kartki zawodników, którzy już w nim są (kolejność sekcji na stronie bez znaczenia).
+    """
+    sections: Dict[str, Tuple[str, list]] = {}
+    events: List[Tuple[str, list]] = []
+    for a in soup.select(f"a[href*='{player_href}']"):
+        name = a.get_text(" ", strip=True).lower()
+        if not name:
+            continue
+        kind = _section_kind(a)
+        if kind == "events":
+            events.append((name, _row_markers(a, player_href)))
+        elif name not in sections:
+            sections[name] = (kind, _row_markers(a, player_href))
+
+    index: Dict[str, Participation] = {}
+    for name, (kind, markers) in sections.items():
+        if kind == "absent":
+            index[name] = Participation(status="not_in_squad")
+            continue
+        sub_in, sub_out, yellow, red = _marks(markers)
+        for ev_name, ev_markers in events:
+            if ev_name != name:
+                continue
+            ev_in, ev_out, ev_yellow, ev_red = _marks(ev_markers)
+            sub_in = sub_in if sub_in is not None else ev_in
+            sub_out = sub_out if sub_out is not None else ev_out
+            # ta sama kartka bywa i w składzie, i w zdarzeniach — nie sumujemy
+            yellow, red = max(yellow, ev_yellow), max(red, ev_red)
+
+        starter = kind == "lineup"
+        if starter:
+            minutes = sub_out if sub_out is not None else full_time
+        elif sub_in is not None:
+            minutes = max((sub_out if sub_out is not None else full_time) - sub_in, 1)
+        else:
+            minutes = None
+        p = Participation(status="played" if minutes else "bench")
+        p.yellow = yellow
+        p.red = red
+        if minutes:
+            p.minutes = minutes
+            rating = next((t.get_text(strip=True) for t in markers if RATING_RX.search(_attr_text(t))), None)
+            try:
+                p.rating = float(rating.replace(",", ".")) if rating else None
+            except ValueError:
+                p.rating = None
+        index[name] = p
+    return index
+
+def parse_match_page(html: Markup, strainer: SoupStrainer, player_href: str,
+                     encoding: Optional[str] = None) -> Dict[str, Participation]:
+    return parse_lineup_sections(BeautifulSoup(html, "lxml", parse_only=strainer, from_encoding=encoding), player_href)
+
+class HtmlMatchParser(MatchParser):
+    """Parser strony meczu: pobiera URL meczu i buduje drzewo tylko z sekcji z `strainer`."""
+
+    strainer: SoupStrainer
+    player_href = ""
+
+    async def _fetch(self, match_url: str) -> Optional[Dict[str, Participation]]:
+        r = await self.http.get(match_url)
+        if not r:
+            return None
+        body, charset = html_payload(r)
+        index = await self.parse_pool.run(parse_match_page, body, self.strainer, self.player_href, charset)
+        return index or None
+
+class ResultadosMatchParser(HtmlMatchParser):
+    source = "resultados"
+    strainer = SoupStrainer(attrs={"class": re.compile(r"alinea|lineup|titular|suplente|banquillo|evento|bajas", re.I)})
+    player_href = "/jugador/"
+
+class PlaymakerMatchParser(HtmlMatchParser):
+    source = "playmaker"
+    strainer = SoupStrainer(id=re.compile(r"game_report|lineup|events", re.I))
+    player_href = "/player/"
+
 # -----------------------
 # RECONCILIATION
 # -----------------------
@@ -636,6 +2600,23 @@ def reconcile(by_source: Dict[str, Participation]) -> Tuple[Participation, List[
 
     return final, conflicts
 
+def describe_sources(urls: Dict[str, Optional[str]], by_source: Dict[str, Participation],
+                     breakers: SourceBreakers, failed: Set[str] = frozenset()) -> Dict[str, str]:
+    """Status per źródło do CSV: ok / not_found / failed (błąd pobrania) / skipped (wyłączone przez circuit breaker)."""
+    out: Dict[str, str] = {}
+    for src, url in urls.items():
+        p = by_source.get(src)
+        have = url is not None and (p is None or p.status != "unknown") and src not in failed
+        if have:
+            out[src] = "ok"
+        elif breakers.is_open(src):
+            out[src] = "skipped"
+        elif src in failed:
+            out[src] = "failed"
+        else:
+            out[src] = "not_found"
+    return out
+
 # -----------------------
 # CSV LOADING
 # -----------------------
@@ -653,113 +2634,408 @@ def load_players_csv(path: Path) -> List[Dict[str,str]]:
     return players
 
 # -----------------------
-# MAIN PIPELINE
+# CHECKPOINTS (fragmenty wyników per zawodnik)
 # -----------------------
 
-async def run_matchcentric(players_csv: Path, output_csv: Path, start: date, end: date, debug: bool, headless: bool, tm_domain: str):
-    logger = configure_logging(output_csv.with_suffix(".log"), debug=debug)
-    logger.info("MATCH-CENTRIC pipeline start")
+class ResultParts:
+    """Trwałe fragmenty wyników: jeden plik JSON per zawodnik w <output>.parts/, zapisywany atomowo.
+
+    Fragment powstaje, gdy gotowe są wszystkie mecze zawodnika i nic się po drodze nie urwało
+    (klub ustalony, terminarz, składy i payloady pobrane, żadne źródło nie pominięte przez breaker),
+    więc przerwany przebieg zostawia komplet wierszy dla zawodników już skończonych; --resume ich nie
+    przetwarza ponownie, a niepełnych próbuje od nowa.
+    Cache nie potrzebuje osobnego dziennika — SQLite/WAL zapisuje każdy set() transakcyjnie.
+    """
+
+    def __init__(self, root: Path, start: date, end: date):
+        self.root = root
+        self.start = start
+        self.end = end
+
+    def _path(self, player: Dict[str, str]) -> Path:
+        # fragment obowiązuje dla tego samego zawodnika, klubu z CSV i okresu
+        ident = json.dumps([player["name"], player.get("team") or "", self.start.isoformat(), self.end.isoformat()],
+                           ensure_ascii=False)
+        slug = re.sub(r"[^a-z0-9]+", "-", norm_person(player["name"])).strip("-")[:40] or "player"
+        return self.root / f"{slug}-{hashlib.sha1(ident.encode('utf-8')).hexdigest()[:10]}.json"
+
+    def load(self, player: Dict[str, str]) -> Optional[List[Dict]]:
+        try:
+            data = json.loads(self._path(player).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        return data.get("rows")
+
+    def store(self, player: Dict[str, str], rows: List[Dict]) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        data = {
+            "player": player["name"],
+            "team": player.get("team") or "",
+            "start": self.start.isoformat(),
+            "end": self.end.isoformat(),
+            "rows": rows,
+        }
+        _atomic_write(self._path(player), json.dumps(data, ensure_ascii=False).encode("utf-8"))
+
+    def clear(self) -> None:
+        if self.root.exists():
+            for path in self.root.glob("*.json"):
+                path.unlink()
 
-    cache = JsonCache(output_csv.with_suffix(".cache.json"))
-    http = HttpClient(logger)
+# -----------------------
+# CACHE MAINTENANCE (unieważnianie)
+# -----------------------
+
+MATCH_KINDS = (("sofascore", "match_url"), ("sofascore", "event_id"), ("fotmob", "match_url"), ("fotmob", "match_id"),
+               ("resultados", "match_url"), ("playmaker", "match_url"))
+
+def _match_hit(pred, key: str) -> bool:
+    d, _, rest = key.partition("|")
+    home, _, away = rest.partition("|")
+    try:
+        return pred(date.fromisoformat(d), home, away)
+    except ValueError:
+        return False
+
+def _misses(cache: SqliteCache, ns: str, kind: str) -> List[str]:
+    """Klucze zapamiętanych chybień (ns, "miss", kind, klucz)."""
+    return [key for k, key in (e[0].split(cache.SEP, 1) for e in cache.entries(ns, "miss")) if k == kind]
+
+def _match_keys_where(cache: SqliteCache, pred) -> List[Tuple]:
+    """Wpisy meczowe (URL/ID per źródło) spełniające pred(date, home, away) + sparsowane składy i chybienia tych meczów."""
+    doomed: List[Tuple] = []
+    for ns, kind in MATCH_KINDS:
+        for key, value in cache.entries(ns, kind):
+            if _match_hit(pred, key):
+                doomed.append((ns, kind, key))
+                if kind != "match_url" or ns in ("resultados", "playmaker"):
+                    # participation jest kluczowane ID (SofaScore/FotMob) albo URL-em (strony HTML)
+                    doomed.append((ns, "participation", str(value)))
+    for ns in {ns for ns, _ in MATCH_KINDS}:
+        doomed += [(ns, "miss", "match_url", key) for key in _misses(cache, ns, "match_url") if _match_hit(pred, key)]
+    return doomed
+
+def invalidate_cache(cache: SqliteCache, players: Sequence[str] = (), clubs: Sequence[str] = (),
+                     dates: Optional[Tuple[date, date]] = None) -> int:
+    """Usuwa z cache wszystko, co dotyczy podanych zawodników, klubów (nazwa albo ID TM) lub zakresu dat.
+
+    Zapamiętane chybienia tych samych wyszukiwań też są usuwane.
+    - zawodnik: profil TM i wyliczone kluby w okresach,
+    - klub: wyszukiwanie klubu, ID drużyny w API, terminarze z ich składami, mecze z udziałem klubu,
+    - daty: terminarze sezonów nachodzących na zakres, składy i mecze z tego zakresu.
+    Zwraca liczbę usuniętych wpisów.
+    """
+    doomed: List[Tuple] = []
+
+    wanted = {norm_person(p) for p in players}
+    for key, profile in cache.entries("tm", "player_profile"):
+        if norm_person(key) in wanted:
+            doomed.append(("tm", "player_profile", key))
+            doomed += [("tm", "clubs_for_period", k) for k, _ in cache.entries("tm", "clubs_for_period")
+                       if k.startswith(f"{profile}|")]
+    doomed += [("tm", "miss", "player_profile", k) for k in _misses(cache, "tm", "player_profile") if norm_person(k) in wanted]
+
+    club_ids = {int(c) for c in clubs if c.strip().isdigit()}
+    club_names = {norm_team(c) for c in clubs if not c.strip().isdigit()}
+    for key, (name, cid) in cache.entries("tm", "club_search"):
+        if norm_team(key) in club_names or norm_team(name) in club_names or int(cid) in club_ids:
+            doomed.append(("tm", "club_search", key))
+            club_ids.add(int(cid))
+            club_names.update({norm_team(key), norm_team(name)})
+    # kluby ustalone z profilu zawodnika (zwykła ścieżka) nie przechodzą przez club_search
+    for _, clubs_in_period in cache.entries("tm", "clubs_for_period"):
+        for name, cid in clubs_in_period:
+            if norm_team(name) in club_names or int(cid) in club_ids:
+                club_ids.add(int(cid))
+                club_names.add(norm_team(name))
+    club_names.discard("")
+    doomed += [("tm", "miss", "club_search", k) for k in _misses(cache, "tm", "club_search") if norm_team(k) in club_names]
+
+    for key, value in cache.entries("tm", "fixtures"):
+        # klucz: club_id|sezon (dawniej club_id|sezon|start|end — takie wpisy też usuwamy)
+        cid, season = key.split("|")[:2]
+        s_start, s_end = season_span(int(season))
+        by_club = int(cid) in club_ids
+        by_dates = bool(dates) and s_start <= dates[1] and dates[0] <= s_end
+        if by_club or by_dates:
+            items = value["fixtures"] if isinstance(value, dict) else value
+            doomed.append(("tm", "fixtures", key))
+            doomed += [("tm", "lineup", item[3]) for item in items
+                       if by_club or dates[0] <= date.fromisoformat(item[0]) <= dates[1]]
+
+    for ns in ("sofascore", "fotmob"):
+        doomed += [(ns, "team_id", k) for k, _ in cache.entries(ns, "team_id") if norm_team(k) in club_names]
+        doomed += [(ns, "miss", "team_id", k) for k in _misses(cache, ns, "team_id") if norm_team(k) in club_names]
+
+    def match_hit(d: date, home: str, away: str) -> bool:
+        if dates and dates[0] <= d <= dates[1]:
+            return True
+        return bool(club_names & {norm_team(home), norm_team(away)})
+
+    if dates or club_names:
+        doomed += _match_keys_where(cache, match_hit)
+    return cache.delete_many(doomed) if doomed else 0
+
+# -----------------------
+# MAIN PIPELINE
+# -----------------------
 
-    tm = TransfermarktResolver(http, cache, logger, domain=tm_domain)
-    pw = PlaywrightResolvers(cache, logger, headless=headless)
+async def run_matchcentric(players_csv: Path, output_csv: Path, start: date, end: date, debug: bool, headless: bool, tm_domain: str,
+                           concurrency: int = 4, per_host_limit: int = 2, host_limits: Optional[Dict[str, int]] = None,
+                           host_rates: Optional[Dict[str, float]] = None, default_rate: float = 1.0, http_cache: bool = True,
+                           archive_dir: Optional[Path] = None, offline: bool = False,
+                           breaker_threshold: int = 5, breaker_cooldown: float = 120.0, match_concurrency: int = 8,
+                           browser_pages: int = 2,
+                           tm_parser: ParserBackend = "lxml",
+                           parse_workers: Optional[int] = None,
+                           resume: bool = False,
+                           invalidate_players: Sequence[str] = (), invalidate_clubs: Sequence[str] = (),
+                           invalidate_dates: Optional[Tuple[date, date]] = None, cache_max_mb: float = 512.0,
+                           retry_negatives: bool = False):
+    logger = configure_logging(output_csv.with_suffix(".log"), debug=debug)
+    logger.info("MATCH-CENTRIC pipeline start" + (" (OFFLINE)" if offline else ""))
+
+    cache_path = output_csv.with_suffix(".cache.sqlite")
+    legacy_cache = output_csv.with_suffix(".cache.json")
+    if offline:
+        # Offline = ponowne parsowanie archiwum, więc wyniki parsowania z cache nie mogą go przesłonić.
+        # Kopia w pamięci tylko z tym, czego w archiwum nie ma; plik cache zostaje nietknięty.
+        # TTL nie obowiązuje: offline nie ma czym odświeżyć przeterminowanych wpisów
+        cache = SqliteCache(":memory:", honor_ttl=False)
+        if cache_path.exists():
+            cache.copy_from(cache_path, keep=OFFLINE_KEEP)
+        elif legacy_cache.exists():
+            cache.import_json(legacy_cache, keep=OFFLINE_KEEP)
+    else:
+        cache = SqliteCache(cache_path, legacy_json=legacy_cache, retry_negatives=retry_negatives)
+        if cache.migrated:
+            logger.info(f"Cache: zaimportowano {cache.migrated} wpisów z {legacy_cache.name} do {cache_path.name}")
+    if invalidate_players or invalidate_clubs or invalidate_dates:
+        removed = invalidate_cache(cache, players=invalidate_players, clubs=invalidate_clubs, dates=invalidate_dates)
+        logger.info(f"Cache: unieważniono {removed} wpisów")
+
+    archive = PageArchive(archive_dir or output_csv.with_suffix(".archive"))
+    if offline and not (archive.root / "index.jsonl").exists():
+        logger.error(f"Brak archiwum stron: {archive.root}")
+        return
+    limiter = HostRateLimiter(host_rates, default_rate=default_rate)
+    breakers = SourceBreakers(threshold=breaker_threshold, cooldown_s=breaker_cooldown)
+    response_cache = HttpResponseCache(output_csv.with_suffix(".http")) if http_cache else None
+    http = HttpClient(logger, per_host_limit=per_host_limit, host_limits=host_limits, limiter=limiter,
+                      response_cache=response_cache, archive=archive, offline=offline, breakers=breakers)
+
+    parse_pool = ParsePool(logger, workers=parse_workers)
+    tm = TransfermarktResolver(http, cache, logger, domain=tm_domain, parser=tm_parser, parse_pool=parse_pool)
+    browser_pool = BrowserPool(logger, headless=headless, size=browser_pages)
+    pw = PlaywrightResolvers(cache, logger, headless=headless, offline=offline, breakers=breakers, pool=browser_pool)
     rf = ResultadosResolver(http, cache, logger)
     pm = PlaymakerResolver(http, cache, logger)
+    api = ApiMatchResolvers(http, cache, logger, browser=pw)
+    sofa = SofaScoreMatchParser(http, cache, logger)
+    fotmob_parser = FotMobMatchParser(http, cache, logger)
+    rf_parser = ResultadosMatchParser(http, cache, logger, parse_pool=parse_pool)
+    pm_parser = PlaymakerMatchParser(http, cache, logger, parse_pool=parse_pool)
 
     players = load_players_csv(players_csv)
     if not players:
         logger.error("Brak zawodników w CSV.")
         return
 
-    all_rows = []
-
-    for player in players:
+    # checkpointy: bez --resume zaczynamy od czystych fragmentów
+    parts = ResultParts(output_csv.with_suffix(".parts"), start, end)
+    done_rows: Dict[int, List[Dict]] = {}
+    if resume:
+        for i, player in enumerate(players):
+            rows = parts.load(player)
+            if rows is not None:
+                done_rows[i] = rows
+        logger.info(f"Wznowienie: {len(done_rows)}/{len(players)} zawodników ma gotowe fragmenty — pomijam ich")
+    else:
+        parts.clear()
+    todo = [i for i in range(len(players)) if i not in done_rows]
+
+    # PLAN: zawodnik -> kluby, kluby -> mecze, mecz -> jeden skład dla wszystkich bramkarzy.
+    # Liczba pobrań skaluje się z liczbą meczów, a nie zawodnicy × mecze.
+    slots = asyncio.Semaphore(max(1, concurrency))
+
+    async def bounded(coro):
+        async with slots:
+            return await coro
+
+    # 1) zawodnik -> kluby w okresie
+    async def resolve_clubs(player: Dict[str, str]) -> List[Tuple[str, int]]:
         player_name = player["name"]
-        logger.info(f"\n=== {player_name} ===")
-
-        profile = tm.search_player_profile(player_name)
-        clubs = []
+        profile = await tm.search_player_profile(player_name)
+        clubs: List[Tuple[str, int]] = []
         if profile:
-            clubs = tm.extract_clubs_for_period(profile, start, end)
-        if not clubs:
+            clubs = await tm.extract_clubs_for_period(profile, start, end)
+        if not clubs and player.get("team"):
             # fallback: klub z CSV (bez ID) -> spróbuj znaleźć club_id na TM
-            if player.get("team"):
-                # quick search for club id by searching team name and taking first Verein
-                club_search_url = f"{tm.base}/schnellsuche/ergebnis/schnellsuche?query={quote(player['team'])}"
-                r = http.get(club_search_url)
-                if r:
-                    soup = BeautifulSoup(r.text, "lxml")
-                    a = soup.select_one("a[href*='/startseite/verein/']")
-                    if a:
-                        m = re.search(r"/verein/(\d+)", a.get("href", ""))
-                        if m:
-                            clubs = [(a.get_text(strip=True), int(m.group(1)))]
-
+            club = await tm.search_club(player["team"])
+            if club:
+                clubs = [club]
         if not clubs:
             logger.warning(f"Nie ustaliłem klubu dla {player_name} — pomijam.")
-            continue
+        return clubs
 
-        # collect matches from each club
-        matches: List[Tuple[MatchKey,str,Optional[str],Optional[str],str]] = []
+    player_clubs = dict(zip(todo, await asyncio.gather(*(bounded(resolve_clubs(players[i])) for i in todo))))
+
+    # 2) grupowanie po club_id
+    club_names: Dict[int, str] = {}
+    club_players: Dict[int, List[str]] = {}
+    for player, clubs in ((players[i], player_clubs[i]) for i in todo):
         for club_name, club_id in clubs:
-            logger.info(f"Klub w okresie: {club_name} (TM id={club_id})")
-            fixtures = tm.club_fixtures(club_id, start, end)
-            for mk, url, comp, score in fixtures:
-                # wstaw prawdziwą nazwę klubu w placeholder
-                home = club_name if mk.home == "CLUB" else mk.home
-                away = club_name if mk.away == "CLUB" else mk.away
-                mk2 = MatchKey(date=mk.date, home=home, away=away)
-                matches.append((mk2, url, comp, score, club_name))
+            club_names.setdefault(club_id, club_name)
+            club_players.setdefault(club_id, []).append(player["name"])
+    for club_id, names in club_players.items():
+        logger.info(f"Klub: {club_names[club_id]} (TM id={club_id}) — bramkarze: {', '.join(names)}")
+
+    # 3) klub -> mecze (terminarz raz na klub)
+    async def load_club_matches(club_id: int) -> Optional[List[MatchPlan]]:
+        club_name = club_names[club_id]
+        fixtures = await tm.club_fixtures(club_id, start, end)
+        if fixtures is None:
+            logger.warning(f"{club_name}: nie pobrano terminarza")
+            return None
+        plans = []
+        for mk, url, comp, score in fixtures:
+            # wstaw prawdziwą nazwę klubu w placeholder
+            home = club_name if mk.home == "CLUB" else mk.home
+            away = club_name if mk.away == "CLUB" else mk.away
+            plans.append(MatchPlan(MatchKey(date=mk.date, home=home, away=away), url, comp, score, club_id))
+        return plans
+
+    club_ids = list(club_names)
+    club_matches = dict(zip(club_ids, await asyncio.gather(*(bounded(load_club_matches(cid)) for cid in club_ids))))
+    # klub bez terminarza (błąd pobrania) = zawodnicy tego klubu nie dostaną checkpointu
+    failed_clubs = {cid for cid, plans in club_matches.items() if plans is None}
+    club_matches = {cid: plans or [] for cid, plans in club_matches.items()}
+
+    # 3b) SofaScore/FotMob: jeden terminarz drużyny wypełnia cache dla wszystkich jej meczów
+    await asyncio.gather(*(
+        bounded(api.prefetch_team(club_names[cid], [plan.match for plan in club_matches[cid]], start, end))
+        for cid in club_ids if club_matches[cid]
+    ))
+
+    # 4) mecz -> URL-e pozostałych źródeł + indeks składu (raz na mecz, nawet gdy grają dwa nasze kluby)
+    unique_matches: Dict[str, MatchPlan] = {}
+    for plans in club_matches.values():
+        for plan in plans:
+            unique_matches.setdefault(plan.tm_url, plan)
+    logger.info(f"Unikalne mecze w okresie: {len(unique_matches)} (kluby: {len(club_ids)}, zawodnicy: {len(todo)})")
+
+    async def load_match(plan: MatchPlan) -> Tuple[Dict[str, Optional[str]], Dict[str, Optional[Dict[str, Participation]]], Set[str]]:
+        """(URL-e źródeł, składy per źródło, źródła z błędem pobrania — wyszukiwanie, skład TM albo payload meczu)."""
+        mk = plan.match
+        logger.info(f"- {mk.date} | {mk.home} vs {mk.away}")
+        urls = {
+            "transfermarkt": plan.tm_url,
+            "sofascore": None,
+            "fotmob": None,
+            "playmaker": None,
+            "resultados": None,
+        }
+        # źródła są od siebie niezależne: czas meczu ~ najwolniejsze źródło, nie suma czterech
+        results = await asyncio.gather(
+            rf.resolve(mk),
+            pm.resolve(mk),
+            api.resolve_sofascore(mk),
+            api.resolve_fotmob(mk),
+            tm.match_lineup(plan.tm_url, when=mk.date),
+            return_exceptions=True,
+        )
+        names = ("resultados", "playmaker", "sofascore", "fotmob", "transfermarkt")
+        failed: Set[str] = set()
+        for name, res in zip(names, results):
+            if isinstance(res, BaseException):
+                failed.add(name)
+                if isinstance(res, LookupFailed):
+                    logger.info(f"{name}: nie udało się wyszukać {mk.home} vs {mk.away} ({mk.date}): {res}")
+                else:
+                    logger.warning(f"{name}: błąd dla {mk.home} vs {mk.away} ({mk.date}): {res!r}")
+        resultados, playmaker, sofascore, fotmob, lineup = (None if isinstance(r, BaseException) else r for r in results)
+        if lineup is None:
+            failed.add("transfermarkt")
+        urls.update(resultados=resultados, playmaker=playmaker, sofascore=sofascore, fotmob=fotmob)
+
+        # składy per źródło: jeden payload na mecz, odpowiada za wszystkich bramkarzy
+        lineups: Dict[str, Optional[Dict[str, Participation]]] = {"transfermarkt": lineup}
+        ids = {
+            "sofascore": cache.get("sofascore", "event_id", match_cache_key(mk)) or sofascore_event_id(sofascore),
+            "fotmob": cache.get("fotmob", "match_id", match_cache_key(mk)) or fotmob_match_id(fotmob),
+            "resultados": resultados,
+            "playmaker": playmaker,
+        }
+        parsers = {"sofascore": sofa, "fotmob": fotmob_parser, "resultados": rf_parser, "playmaker": pm_parser}
+        todo = [(src, mid) for src, mid in ids.items() if mid]
+        parsed = await asyncio.gather(
+            *(parsers[src].participations(mid, when=mk.date) for src, mid in todo),
+            return_exceptions=True,
+        )
+        for (src, mid), res in zip(todo, parsed):
+            if isinstance(res, BaseException):
+                logger.warning(f"{src}: błąd parsowania meczu {mid}: {res!r}")
+            else:
+                lineups[src] = res
+            if res is None or isinstance(res, BaseException):
+                failed.add(src)
+        return urls, lineups, failed
 
-        # dedupe by date+opponent (rough)
-        seen=set()
-        uniq=[]
-        for mk,url,comp,score,club_name in matches:
-            key=(mk.date.isoformat(), norm_team(mk.home), norm_team(mk.away))
-            if key in seen: 
-                continue
-            seen.add(key)
-            uniq.append((mk,url,comp,score,club_name))
+    # osobny limit dla meczów: każdy mecz sam w sobie rozchodzi się na 5 źródeł
+    match_slots = asyncio.Semaphore(max(1, match_concurrency))
 
-        logger.info(f"Mecze w okresie: {len(uniq)}")
+    async def bounded_match(plan: MatchPlan):
+        async with match_slots:
+            return await load_match(plan)
 
-        for mk, tm_match_url, comp, score, club_name in uniq:
-            logger.info(f"- {mk.date} | {mk.home} vs {mk.away}")
+    # mecze jako zadania: zawodnik jest gotowy, gdy skończą się jego mecze — nie czeka na cały okres
+    match_tasks = {u: asyncio.ensure_future(bounded_match(plan)) for u, plan in unique_matches.items()}
 
-            urls = {
-                "transfermarkt": tm_match_url,
-                "sofascore": None,
-                "fotmob": None,
-                "playmaker": None,
-                "resultados": None,
-            }
+    # 5) wiersze: per zawodnik, odpowiedzi z indeksów składów; fragment zapisywany od razu po zawodniku,
+    # ale tylko gdy nic się nie urwało — inaczej --resume uznałby niepełne wiersze za gotowe
+    async def finish_player(player: Dict[str, str], clubs: List[Tuple[str, int]]) -> List[Dict]:
+        player_name = player["name"]
+        complete = bool(clubs) and not any(club_id in failed_clubs for _, club_id in clubs)
+
+        # dedupe by date+opponent (rough)
+        seen = set()
+        uniq: List[MatchPlan] = []
+        for _, club_id in clubs:
+            for plan in club_matches.get(club_id, []):
+                key = (plan.match.date.isoformat(), norm_team(plan.match.home), norm_team(plan.match.away))
+                if key in seen:
+                    continue
+                seen.add(key)
+                uniq.append(plan)
+        logger.info(f"{player_name}: mecze w okresie: {len(uniq)}")
 
-            # resolve other match pages
-            # (1) try cache/heuristics
-            urls["resultados"] = rf.resolve(mk)
-            urls["playmaker"] = pm.resolve(mk)
-            urls["sofascore"] = await pw.resolve_sofascore(mk)
-            urls["fotmob"] = await pw.resolve_fotmob(mk)
+        match_results = await asyncio.gather(*(match_tasks[plan.tm_url] for plan in uniq))
+        rows: List[Dict] = []
+        for plan, (urls, lineups, failed) in zip(uniq, match_results):
+            mk = plan.match
+            complete = complete and not failed
 
             by_source: Dict[str, Participation] = {}
-            by_source["transfermarkt"] = tm.parse_match_participation(tm_match_url, player_name)
-
-            # TODO: dodać realne parsery dla innych źródeł (match pages)
-            # Na tym etapie resolvery są kluczowe (ID/URL automatycznie).
-            # Parsery można dopinać iteracyjnie: sofascore -> rating + minutes + GK conceded, itd.
+            for src, index in lineups.items():
+                if src == "transfermarkt" or index is not None:
+                    by_source[src] = lookup_participation(index, player_name)
 
             final, conflicts = reconcile(by_source)
+            sources_status = describe_sources(urls, by_source, breakers, failed)
+            skipped = [src for src, st in sources_status.items() if st == "skipped"]
+            if skipped:
+                conflicts.append(f"sources_skipped (circuit open): {', '.join(skipped)}")
+                complete = False
 
-            all_rows.append({
+            rows.append({
                 "player": player_name,
                 "date": mk.date.isoformat(),
                 "home": mk.home,
                 "away": mk.away,
-                "competition": comp,
-                "score": score,
+                "competition": plan.competition,
+                "score": plan.score,
                 "status": final.status,
+                "sources_status": ";".join(f"{src}={st}" for src, st in sources_status.items()),
                 "minutes": final.minutes,
                 "goals_conceded": final.goals_conceded,
                 "clean_sheet": final.clean_sheet,
@@ -774,14 +3050,40 @@ async def run_matchcentric(players_csv: Path, output_csv: Path, start: date, end
                 "conflicts": "; ".join(conflicts) if conflicts else "",
             })
 
-        # monthly average rating (from match mean)
-        # (w tej wersji parser ratingów jeszcze nie jest podpięty — kolumna zostaje NaN)
-        # zostawiamy to, bo pipeline wymaga, a ratingi dopniesz w następnym kroku.
+        if complete:
+            parts.store(player, rows)
+        else:
+            logger.info(f"{player_name}: niepełne dane (błędy pobrania / pominięte źródła) — bez checkpointu, --resume ponowi")
+        return rows
+
+    try:
+        finished = await asyncio.gather(*(finish_player(players[i], player_clubs[i]) for i in todo))
+    finally:
+        for task in match_tasks.values():
+            task.cancel()
+        # przeglądarka i procesy parserów są potrzebne tylko do tego etapu — zamykamy je raz, także po błędzie
+        await browser_pool.close()
+        parse_pool.close()
+        http.close()
+    done_rows.update(zip(todo, finished))
+
+    # kolejność wierszy jak w CSV, niezależnie od tego, co pochodzi z fragmentów
+    all_rows = [row for i in range(len(players)) for row in done_rows[i]]
+
+    # monthly average rating (from match mean)
+    # (średnia miesięczna jeszcze nie jest liczona — rating_mean jest per mecz)
 
     df = pd.DataFrame(all_rows)
     output_csv.parent.mkdir(parents=True, exist_ok=True)
     df.to_csv(output_csv, index=False, encoding="utf-8")
+    if not offline:
+        expired, evicted = cache.evict(int(cache_max_mb * 1024 * 1024))
+        if expired or evicted:
+            logger.info(f"Cache: usunięto {expired} przeterminowanych i {evicted} najstarszych wpisów (limit {cache_max_mb:g} MB)")
     cache.save()
+    cache.close()
+    for src, info in breakers.summary().items():
+        logger.warning(f"Circuit breaker {src}: stan={info['state']}, otwarć={info['trips']}, pominiętych wywołań={info['skipped']}")
     logger.info(f"\nZapisano: {output_csv}")
 
 def main():
@@ -793,6 +3095,36 @@ def main():
     ap.add_argument("--end", default="2026-01-31")
     ap.add_argument("--debug", action="store_true")
     ap.add_argument("--headless", action="store_true", help="Playwright headless (default True)")
+    ap.add_argument("--concurrency", type=int, default=4, help="ilu zawodników/klubów przetwarzać równolegle")
+    ap.add_argument("--match-concurrency", type=int, default=8, help="ile meczów rozwiązywać równolegle (każdy: 5 źródeł naraz)")
+    ap.add_argument("--per-host", type=int, default=2, help="domyślny limit równoległych requestów na host")
+    ap.add_argument("--host-limit", action="append", default=[], metavar="HOST=N",
+                    help="limit równoległych requestów dla hosta, np. transfermarkt.com=1 (powtarzalne)")
+    ap.add_argument("--rate", action="append", default=[], metavar="HOST=RPS",
+                    help="budżet requestów/s dla domeny, np. transfermarkt.com=0.5 (powtarzalne)")
+    ap.add_argument("--default-rate", type=float, default=1.0, help="requestów/s dla domen bez własnego budżetu")
+    ap.add_argument("--no-http-cache", action="store_true", help="nie używaj cache odpowiedzi HTTP (ETag/Last-Modified)")
+    ap.add_argument("--archive", default=None, help="katalog archiwum surowych stron (domyślnie <output>.archive)")
+    ap.add_argument("--offline", action="store_true", help="bez sieci: przetwórz ponownie strony z archiwum")
+    ap.add_argument("--browser-pages", type=int, default=2, help="ile stron/kontekstów Playwright trzymać w puli")
+    ap.add_argument("--tm-parser", choices=PARSER_BACKENDS, default="lxml",
+                    help="backend parsowania terminarzy TM: lxml (szybki) albo bs4 (pełne drzewo BeautifulSoup)")
+    ap.add_argument("--parse-workers", type=int, default=None,
+                    help="ile procesów parsuje HTML równolegle z pobieraniem (0 = w głównym procesie; domyślnie rdzenie-1, max 4)")
+    ap.add_argument("--resume", action="store_true",
+                    help="wznów przerwany przebieg: pomiń zawodników z gotowymi fragmentami w <output>.parts/")
+    ap.add_argument("--invalidate-player", action="append", default=[], metavar="NAME",
+                    help="usuń z cache profil i kluby zawodnika (powtarzalne)")
+    ap.add_argument("--invalidate-club", action="append", default=[], metavar="NAME|TM_ID",
+                    help="usuń z cache terminarze, składy i mecze klubu (powtarzalne)")
+    ap.add_argument("--invalidate-dates", default=None, metavar="FROM:TO",
+                    help="usuń z cache terminarze, składy i mecze z zakresu dat, np. 2026-01-01:2026-01-31")
+    ap.add_argument("--retry-negatives", action="store_true",
+                    help="ponów wyszukiwania zapamiętane jako nieudane (zawodnicy, kluby, mecze), zamiast czekać na ich TTL")
+    ap.add_argument("--cache-max-mb", type=float, default=512.0,
+                    help="limit rozmiaru danych cache; po przebiegu najstarsze wpisy ponad limit są usuwane")
+    ap.add_argument("--breaker-threshold", type=int, default=5, help="po ilu porażkach z rzędu wyłączyć źródło")
+    ap.add_argument("--breaker-cooldown", type=float, default=120.0, help="na ile sekund wyłączyć źródło (potem 1 próba)")
     args = ap.parse_args()
 
     start = datetime.strptime(args.start, "%Y-%m-%d").date()
@@ -802,8 +3134,30 @@ def main():
     headless = True
 
     try:
-        import asyncio
-        asyncio.run(run_matchcentric(Path(args.input), Path(args.output), start, end, args.debug, headless, args.tm_domain))
+        host_limits = parse_host_pairs(args.host_limit, int)
+        host_rates = parse_host_pairs(args.rate, float)
+    except ValueError as e:
+        ap.error(str(e))
+
+    invalidate_dates = None
+    if args.invalidate_dates:
+        try:
+            d_from, d_to = args.invalidate_dates.split(":")
+            invalidate_dates = (date.fromisoformat(d_from), date.fromisoformat(d_to))
+        except ValueError:
+            ap.error(f"--invalidate-dates: oczekiwano RRRR-MM-DD:RRRR-MM-DD, jest {args.invalidate_dates!r}")
+
+    try:
+        asyncio.run(run_matchcentric(Path(args.input), Path(args.output), start, end, args.debug, headless, args.tm_domain,
+                                     concurrency=args.concurrency, per_host_limit=args.per_host, host_limits=host_limits,
+                                     host_rates=host_rates, default_rate=args.default_rate, http_cache=not args.no_http_cache,
+                                     archive_dir=Path(args.archive) if args.archive else None, offline=args.offline,
+                                     breaker_threshold=args.breaker_threshold, breaker_cooldown=args.breaker_cooldown,
+                                     match_concurrency=args.match_concurrency, browser_pages=args.browser_pages,
+                                     tm_parser=args.tm_parser, parse_workers=args.parse_workers, resume=args.resume,
+                                     invalidate_players=args.invalidate_player, invalidate_clubs=args.invalidate_club,
+                                     invalidate_dates=invalidate_dates, cache_max_mb=args.cache_max_mb,
+                                     retry_negatives=args.retry_negatives))
     except KeyboardInterrupt:
         print("Przerwano.")
         sys.exit(1)